@@ -0,0 +1,30 @@
+"""
+Benchmarks of the dependent peptides pipeline on 'allPeptides.txt'-shaped tables.
+"""
+import os
+import shutil
+import tempfile
+from perseuspy.dependent_peptides import run_dependent_peptides, read_dependent_peptides
+from .generators import generate_all_peptides
+
+class DependentPeptides:
+    params = [10000, 100000]
+    param_names = ['rows']
+    timeout = 300
+
+    def setup(self, rows):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.all_peptides, self.raw_files_table = generate_all_peptides(self.tmp_dir, rows=rows)
+        self.outfile = os.path.join(self.tmp_dir, 'dependentPeptides.txt')
+
+    def teardown(self, rows):
+        shutil.rmtree(self.tmp_dir)
+
+    def time_read_dependent_peptides(self, rows):
+        read_dependent_peptides(self.all_peptides)
+
+    def time_run_dependent_peptides(self, rows):
+        run_dependent_peptides(self.all_peptides, self.raw_files_table, self.outfile)
+
+    def peakmem_run_dependent_peptides(self, rows):
+        run_dependent_peptides(self.all_peptides, self.raw_files_table, self.outfile)
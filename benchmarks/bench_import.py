@@ -0,0 +1,16 @@
+"""
+Benchmarks of the startup time of plugin scripts. Each import runs in a fresh interpreter.
+"""
+
+class Import:
+    def timeraw_import_perseuspy(self):
+        return "import perseuspy"
+
+    def timeraw_import_matrix(self):
+        return "from perseuspy import pd"
+
+    def timeraw_import_networks(self):
+        return "from perseuspy import nx, read_networks"
+
+    def timeraw_import_parameters(self):
+        return "import perseuspy.parameters"
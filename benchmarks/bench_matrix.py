@@ -0,0 +1,60 @@
+"""
+Benchmarks of reading and writing Perseus matrices.
+"""
+import os
+import shutil
+import tempfile
+from perseuspy import pd
+from .generators import generate_matrix
+
+class ReadMatrix:
+    params = ([10000, 100000], [10, 100])
+    param_names = ['rows', 'main']
+
+    def setup(self, rows, main):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'matrix.txt')
+        generate_matrix(rows=rows, main=main, multi_numeric=1, annotation_rows=2).to_perseus(self.path)
+
+    def teardown(self, rows, main):
+        shutil.rmtree(self.tmp_dir)
+
+    def time_read_perseus(self, rows, main):
+        pd.read_perseus(self.path)
+
+    def time_read_perseus_ragged_float32(self, rows, main):
+        pd.read_perseus(self.path, multi_numeric='ragged', float_dtype='float32', text_dtype='auto')
+
+    def time_read_perseus_main_columns(self, rows, main):
+        pd.read_perseus(self.path, types={'E'})
+
+    def time_read_perseus_chunks(self, rows, main):
+        for chunk in pd.read_perseus(self.path, chunksize=10000):
+            pass
+
+    def peakmem_read_perseus(self, rows, main):
+        pd.read_perseus(self.path)
+
+    def peakmem_read_perseus_ragged_float32(self, rows, main):
+        pd.read_perseus(self.path, multi_numeric='ragged', float_dtype='float32', text_dtype='auto')
+
+class WriteMatrix:
+    params = ([10000, 100000], [10, 100])
+    param_names = ['rows', 'main']
+
+    def setup(self, rows, main):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'matrix.txt')
+        self.df = generate_matrix(rows=rows, main=main, multi_numeric=1, annotation_rows=2)
+
+    def teardown(self, rows, main):
+        shutil.rmtree(self.tmp_dir)
+
+    def time_to_perseus(self, rows, main):
+        self.df.to_perseus(self.path)
+
+    def time_to_perseus_float_format(self, rows, main):
+        self.df.to_perseus(self.path, float_format='%.6g')
+
+    def peakmem_to_perseus(self, rows, main):
+        self.df.to_perseus(self.path)
@@ -0,0 +1,53 @@
+"""
+Benchmarks of reading, converting and writing Perseus network collections.
+"""
+import os
+import shutil
+import tempfile
+from perseuspy import nx, read_networks, write_networks
+from .generators import generate_networks
+
+class NetworkIO:
+    params = [1000, 10000]
+    param_names = ['nodes']
+
+    def setup(self, nodes):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.folder = os.path.join(self.tmp_dir, 'networks')
+        generate_networks(self.folder, networks=3, nodes=nodes, edges=3 * nodes)
+        self.network_table, self.networks = read_networks(self.folder, lazy=False)
+
+    def teardown(self, nodes):
+        shutil.rmtree(self.tmp_dir)
+
+    def time_read_networks(self, nodes):
+        read_networks(self.folder, lazy=False)
+
+    def time_write_networks(self, nodes):
+        write_networks(os.path.join(self.tmp_dir, 'out'), self.network_table, self.networks)
+
+    def peakmem_read_networks(self, nodes):
+        read_networks(self.folder, lazy=False)
+
+class NetworkConversion:
+    params = [1000, 10000]
+    param_names = ['nodes']
+
+    def setup(self, nodes):
+        self.tmp_dir = tempfile.mkdtemp()
+        folder = os.path.join(self.tmp_dir, 'networks')
+        generate_networks(folder, networks=3, nodes=nodes, edges=3 * nodes)
+        self.network_table, self.networks = read_networks(folder, lazy=False)
+        self.graphs = nx.from_perseus(self.network_table, self.networks)
+
+    def teardown(self, nodes):
+        shutil.rmtree(self.tmp_dir)
+
+    def time_from_perseus(self, nodes):
+        nx.from_perseus(self.network_table, self.networks)
+
+    def time_to_perseus(self, nodes):
+        nx.to_perseus(self.graphs)
+
+    def peakmem_from_perseus(self, nodes):
+        nx.from_perseus(self.network_table, self.networks)
@@ -0,0 +1,123 @@
+"""
+Seeded generators of synthetic Perseus inputs for the benchmarks.
+
+>>> df = generate_matrix(rows=100000, main=50, multi_numeric=2, seed=0)
+>>> df.to_perseus(path)
+"""
+import os
+import uuid
+import numpy as np
+import pandas as pd
+
+def generate_matrix(rows=10000, main=10, numeric=2, text=2, categorical=2, multi_numeric=0,
+        annotation_rows=1, categories=5, seed=0):
+    """
+    Generate a matrix with the column types written by `to_perseus`.
+    :param rows: Number of rows.
+    :param main: Number of main 'E' columns.
+    :param numeric: Number of numeric 'N' columns.
+    :param text: Number of text 'T' columns with unique values.
+    :param categorical: Number of categorical 'C' columns.
+    :param multi_numeric: Number of multi-numeric 'M' columns with 0 to 3 values per row.
+    :param annotation_rows: Number of categorical annotation rows.
+    :param categories: Number of distinct values of categorical columns and annotation rows.
+    :param seed: Seed of the random number generator.
+    :returns: pd.DataFrame, main columns first.
+    """
+    random = np.random.RandomState(seed)
+    columns = {}
+    for i in range(main):
+        values = random.lognormal(20, 2, rows)
+        values[random.rand(rows) < 0.1] = np.nan
+        columns['Intensity {}'.format(i)] = values
+    for i in range(numeric):
+        columns['Score {}'.format(i)] = random.rand(rows) * 100
+    for i in range(text):
+        columns['Text {}'.format(i)] = ['P{:05d}-{}'.format(j, i) for j in range(rows)]
+    for i in range(categorical):
+        codes = random.randint(0, categories, rows)
+        columns['Category {}'.format(i)] = pd.Categorical.from_codes(codes,
+                ['Category {}'.format(j) for j in range(categories)])
+    for i in range(multi_numeric):
+        lengths = random.randint(0, 4, rows)
+        values = np.round(random.rand(lengths.sum()), 4).tolist()
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+        columns['Multi {}'.format(i)] = [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    df = pd.DataFrame(columns)
+    names = list(df.columns)
+    levels = [names]
+    for i in range(annotation_rows):
+        levels.append(['Group {}'.format(random.randint(categories)) for _ in names])
+    df.columns = pd.MultiIndex.from_arrays(levels,
+            names=['Column Name'] + ['Annotation {}'.format(i) for i in range(annotation_rows)])
+    if annotation_rows == 0:
+        df.columns = df.columns.get_level_values(0)
+    return df
+
+def generate_networks(folder, networks=3, nodes=1000, edges=3000, seed=0):
+    """
+    Write a network collection with random graphs to a folder, see `write_networks`.
+    :param folder: Path to the output folder.
+    :param networks: Number of networks.
+    :param nodes: Number of nodes per network.
+    :param edges: Number of edges per network.
+    :param seed: Seed of the random number generator.
+    """
+    from perseuspy.io.perseus.network import write_networks
+    random = np.random.RandomState(seed)
+    network_table = []
+    tables = {}
+    for i in range(networks):
+        guid = str(uuid.UUID(int=int(random.randint(0, 2**31)) + i))
+        node_names = np.array(['node {}'.format(j) for j in range(nodes)])
+        node_table = pd.DataFrame({'Node': node_names, 'Degree': random.randint(0, 100, nodes).astype(float)})
+        node_table.columns.name = 'Column Name'
+        edge_table = pd.DataFrame({'Source': node_names[random.randint(0, nodes, edges)],
+            'Target': node_names[random.randint(0, nodes, edges)], 'Weight': random.rand(edges)})
+        edge_table = edge_table.drop_duplicates(['Source', 'Target']).reset_index(drop=True)
+        edge_table.columns.name = 'Column Name'
+        network_table.append({'Name': 'network {}'.format(i), 'GUID': guid,
+            'Nodes': float(nodes), 'Edges': float(len(edge_table))})
+        tables[guid] = {'name': 'network {}'.format(i), 'guid': guid,
+                'node_table': node_table, 'edge_table': edge_table}
+    network_table = pd.DataFrame(network_table, columns=['Nodes', 'Edges', 'GUID', 'Name'])
+    network_table.columns.name = 'Column Name'
+    write_networks(folder, network_table, tables)
+
+_amino_acids = list('ACDEFGHIKLMNPQRSTVWY')
+def generate_all_peptides(folder, rows=10000, raw_files=6, clusters=500, seed=0):
+    """
+    Write an 'allPeptides.txt'-shaped table and the matching raw files table to a folder.
+    :param folder: Path to the output folder.
+    :param rows: Number of rows of the 'allPeptides.txt' table.
+    :param raw_files: Number of raw files.
+    :param clusters: Number of dependent peptide clusters.
+    :param seed: Seed of the random number generator.
+    :returns: Paths to the 'allPeptides.txt' and 'rawFilesTable.txt' files.
+    """
+    random = np.random.RandomState(seed)
+    files = ['experiment_{:02d}'.format(i) for i in range(raw_files)]
+    sequences = [''.join(random.choice(_amino_acids, 10)) for _ in range(clusters)]
+    proteins = ['P{:05d};Q{:05d}'.format(i, i + 1) for i in range(clusters)]
+    cluster = random.randint(0, clusters, rows)
+    localizations = [';'.join(random.choice(_amino_acids + ['nterm'], random.randint(1, 3), replace=False))
+            for _ in range(rows)]
+    ratios = np.round(random.lognormal(0, 1, rows), 6)
+    ratios[random.rand(rows) < 0.2] = np.nan
+    df = pd.DataFrame({
+        'Raw file': np.array(files)[random.randint(0, raw_files, rows)],
+        'DP Base Sequence': np.array(sequences)[cluster],
+        'DP AA': localizations,
+        'DP Proteins': np.array(proteins)[cluster],
+        'DP Cluster Index': cluster.astype(float),
+        'DP Modification': np.array(['Oxidation', 'Phospho', 'Acetyl'])[cluster % 3],
+        'DP Ratio mod/base': ratios})
+    df.columns.name = 'Column Name'
+    all_peptides = os.path.join(folder, 'allPeptides.txt')
+    df.to_perseus(all_peptides, main_columns=[])
+    raw_files_table = os.path.join(folder, 'rawFilesTable.txt')
+    pd.DataFrame({'File': ['D:\\raw\\{}.raw'.format(name) for name in files],
+        'Exists': True, 'Size': '1 GB', 'Data format': 'Thermo raw file',
+        'Parameter group': 'Group 0', 'Experiment': ['experiment {}'.format(i // 2) for i in range(raw_files)],
+        'Fraction': [i % 2 + 1 for i in range(raw_files)]}).to_csv(raw_files_table, sep='\t', index=False)
+    return all_peptides, raw_files_table
@@ -1,16 +1,85 @@
-"""
-perseuspy module for Python-Perseus interop.
-"""
-from perseuspy.version import version_string as __version__
-import perseuspy.dependent_peptides
-import perseuspy.io.perseus.matrix
-# Monkey-patching pandas
-import pandas as pd
-pd.DataFrame.to_perseus = perseuspy.io.perseus.matrix.to_perseus
-pd.read_perseus = perseuspy.io.perseus.matrix.read_perseus
-
-import perseuspy.io.perseus.network
-from perseuspy.io.perseus.network import read_networks, write_networks
-import networkx as nx
-nx.from_perseus = perseuspy.io.perseus.network.from_perseus
-nx.to_perseus = perseuspy.io.perseus.network.to_perseus
+"""
+perseuspy module for Python-Perseus interop.
+
+Submodules, pandas and networkx are imported lazily on first access, e.g. of
+`perseuspy.pd`, `perseuspy.nx` or `perseuspy.read_networks`, to keep the
+startup time of plugin scripts low. Importing the matrix I/O does not import
+networkx and `import perseuspy` alone imports neither.
+
+pandas is monkey-patched with `read_perseus` and `DataFrame.to_perseus` as soon
+as it is imported after `import perseuspy`, or right away if it was imported
+before. A hook in `sys.meta_path` runs the patching once pandas is loaded.
+networkx is patched with `from_perseus` and `to_perseus` in the same way.
+"""
+import sys
+from perseuspy.version import version_string as __version__
+
+def _patch_pandas():
+    """ Import the matrix module, which monkey-patches pandas. """
+    import perseuspy.io.perseus.matrix
+    import pandas as pd
+    return pd
+
+def _patch_networkx():
+    """ Monkey-patch networkx with the conversion functions of the network module. """
+    import networkx as nx
+    import perseuspy.io.perseus.network
+    nx.from_perseus = perseuspy.io.perseus.network.from_perseus
+    nx.to_perseus = perseuspy.io.perseus.network.to_perseus
+    return nx
+
+class _PatchOnImport():
+    """Meta path finder which patches a module once it is imported.
+    :param patches: Dictionary of module name -> patch function."""
+    def __init__(self, patches):
+        self.patches = patches
+
+    def find_spec(self, name, path=None, target=None):
+        if name not in self.patches:
+            return None
+        import importlib.util
+        patch = self.patches.pop(name)
+        if not self.patches:
+            sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            return spec
+        exec_module = spec.loader.exec_module
+        def exec_and_patch(module):
+            exec_module(module)
+            patch()
+        spec.loader.exec_module = exec_and_patch
+        return spec
+
+_lazy_submodules = {'io', 'dependent_peptides', 'parameters', 'instrumentation', 'worker'}
+_network_attributes = {'read_networks', 'write_networks'}
+
+def __getattr__(name):
+    if name == 'pd':
+        return _patch_pandas()
+    if name == 'nx':
+        return _patch_networkx()
+    if name in _network_attributes:
+        _patch_networkx()
+        import perseuspy.io.perseus.network
+        return getattr(perseuspy.io.perseus.network, name)
+    if name == 'io':
+        import perseuspy.io.perseus.matrix # perseuspy.io.perseus.matrix was available after import perseuspy
+        return perseuspy.io
+    if name in _lazy_submodules:
+        import importlib
+        return importlib.import_module('perseuspy.' + name)
+    raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+
+# patch right away if pandas or networkx are already in use
+_patches = {}
+if 'pandas' in sys.modules:
+    _patch_pandas()
+else:
+    _patches['pandas'] = _patch_pandas
+if 'networkx' in sys.modules:
+    _patch_networkx()
+else:
+    _patches['networkx'] = _patch_networkx
+if _patches:
+    sys.meta_path.insert(0, _PatchOnImport(_patches))
@@ -5,14 +5,15 @@ and are annotated using the `experimentalDesign.txt`.
 This code forms the basis for the corresponding Perseus plugin PluginDependentPeptides.
 """
 import pandas as pd
-from perseuspy.io.perseus.matrix import read_perseus
-pd.read_perseus = read_perseus
+import perseuspy.io.perseus.matrix # patches pandas
 from perseuspy.io.maxquant import read_rawFilesTable
 from perseuspy.parameters import fileParam, parse_parameters
+from perseuspy.instrumentation import instrumented, stage
 import numpy as np
 
 _index_columns = ['DP Proteins', 'DP Base Sequence', 'DP Cluster Index', 'DP Modification']
 _cols = ['DP Ratio mod/base', 'Raw file', 'DP AA'] + _index_columns
+@instrumented('read_dependent_peptides')
 def read_dependent_peptides(filename):
     """ read the dependent peptides table and extract localiztion information
     :param filename: path to the 'allPeptides.txt' table.
@@ -21,9 +22,11 @@ def read_dependent_peptides(filename):
     df = (pd.read_perseus(filename, usecols=_cols)
             .dropna(subset=['DP Ratio mod/base']))
     df['DP Ratio mod/base'] = df['DP Ratio mod/base'].astype(float)
-    dep = df.pivot_table('DP Ratio mod/base', index=_index_columns,
-                columns='Raw file', aggfunc=np.median)
-    localization = _count_localizations(df)
+    with stage('pivot'):
+        dep = df.pivot_table('DP Ratio mod/base', index=_index_columns,
+                    columns='Raw file', aggfunc=np.median)
+    with stage('localizations'):
+        localization = _count_localizations(df)
     return dep, localization
 
 def _set_column_names(dep, exp):
@@ -88,6 +91,7 @@ def run_dependent_peptides_from_parameters(paramfile, outfile):
     rawFilesTable_file = fileParam(parameters, 'Raw files table')
     run_dependent_peptides(allPeptides_file, rawFilesTable_file, outfile)
 
+@instrumented('run_dependent_peptides')
 def run_dependent_peptides(allPeptides_file, rawFilesTable_file, outfile):
     """ transform a allPeptides.txt and experimentalDesign.txt table
     into the dependentPeptides.txt table written in outfile.
@@ -96,9 +100,12 @@ def run_dependent_peptides(allPeptides_file, rawFilesTable_file, outfile):
     :param outfile: Path to the output file.
     """
     __dep, localization = read_dependent_peptides(allPeptides_file)
-    exp = read_rawFilesTable(rawFilesTable_file)
-    _dep = _set_column_names(__dep, exp)
+    with stage('read_raw_files_table'):
+        exp = read_rawFilesTable(rawFilesTable_file)
+    with stage('set_column_names'):
+        _dep = _set_column_names(__dep, exp)
     main_columns = list(_dep.columns)
-    dep = _dep.join(localization).reset_index()
+    with stage('join'):
+        dep = _dep.join(localization).reset_index()
     dep.to_perseus(outfile, main_columns=main_columns)
 
@@ -0,0 +1,213 @@
+""" Opt-in stage timing and memory instrumentation
+
+Records the wall time, the number of rows and bytes processed and the peak
+traced memory of each stage, e.g. header parsing, CSV parsing and column-index
+building in `read_perseus`. The peak resident set size is that of the whole
+process up to the end of the stage, i.e. not specific to the stage. Nested stages are named by their path, e.g.
+'read_perseus/parse'. Disabled stages cost a single flag check.
+
+Instrument a block of code with a context manager:
+
+>>> from perseuspy.instrumentation import instrument
+>>> with instrument(tracemalloc=True) as profile:
+...     df = pd.read_perseus(infile)
+>>> profile.to_json('profile.json')
+
+or a whole plugin run with the `PERSEUSPY_INSTRUMENT` environment variable.
+Set it to 'log' to emit every record to the 'perseuspy.instrumentation' logger
+at INFO level, or to a file path to append the records as JSON lines.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+import tracemalloc as _tracemalloc
+
+logger = logging.getLogger(__name__)
+_profiles = []
+_local = threading.local()
+
+class Profile():
+    """Collection of stage records.
+    :param tracemalloc: Trace Python memory allocations to record the peak per stage, default=False.
+        Tracing slows down allocation heavy code considerably. Requires Python 3.9,
+        the peak is not recorded on older versions.
+    :param log: Emit each record to the 'perseuspy.instrumentation' logger, default=False.
+    :param path: Append each record as a JSON line to this file, default=None."""
+    def __init__(self, tracemalloc=False, log=False, path=None):
+        self.tracemalloc = tracemalloc
+        self.log = log
+        self.path = path
+        self.records = []
+
+    def add(self, record):
+        """ Store a record and pass it on to the logger and file. """
+        self.records.append(record)
+        if self.log:
+            logger.info('%s', json.dumps(record))
+        if self.path is not None:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def to_json(self, path_or_file=None):
+        """
+        Export all records as JSON array.
+        :param path_or_file: File path or file-like, default=None returns the JSON string.
+        """
+        if path_or_file is None:
+            return json.dumps(self.records, indent=2)
+        if isinstance(path_or_file, str):
+            with open(path_or_file, 'w') as f:
+                json.dump(self.records, f, indent=2)
+        else:
+            json.dump(self.records, path_or_file, indent=2)
+
+    def summary(self):
+        """ Total wall time and number of calls per stage.
+        :returns: Dictionary of stage -> {'calls', 'wall_time'}."""
+        result = {}
+        for record in self.records:
+            entry = result.setdefault(record['stage'], {'calls': 0, 'wall_time': 0.0})
+            entry['calls'] += 1
+            entry['wall_time'] += record['wall_time']
+        return result
+
+class instrument():
+    """Context manager recording all stages executed in its body.
+    :param tracemalloc: Trace Python memory allocations, see `Profile`.
+    :param log: Emit each record to the 'perseuspy.instrumentation' logger, default=False."""
+    def __init__(self, tracemalloc=False, log=False):
+        self.profile = Profile(tracemalloc=tracemalloc, log=log)
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        if self.profile.tracemalloc and not _tracemalloc.is_tracing():
+            _tracemalloc.start()
+            self._started_tracemalloc = True
+        _profiles.append(self.profile)
+        return self.profile
+
+    def __exit__(self, *args):
+        _profiles.remove(self.profile)
+        if self._started_tracemalloc:
+            _tracemalloc.stop()
+
+def enabled():
+    """ True if any profile is active. """
+    return len(_profiles) > 0
+
+class stage():
+    """Context manager recording a single stage. Rows and bytes processed
+    can be set on the yielded record. No-op if no profile is active.
+
+    >>> with stage('parse') as record:
+    ...     df = parse()
+    ...     record['rows'] = len(df)
+
+    :param name: Name of the stage.
+    :param info: Additional entries of the record."""
+    def __init__(self, name, **info):
+        self.name = name
+        self.info = info
+        self.record = None
+
+    def __enter__(self):
+        if not _profiles:
+            return {}
+        stack = _stack()
+        parent = stack[-1] if stack else None
+        prefix = parent.record['stage'] + '/' if parent else ''
+        self.record = dict({'stage': prefix + self.name, 'rows': None, 'bytes': None}, **self.info)
+        self.tracing = _tracemalloc.is_tracing() and _can_reset_peak
+        if self.tracing:
+            current, peak = _tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent.peak = max(parent.peak, peak)
+            _tracemalloc.reset_peak()
+            self.memory_start = self.peak = current
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *args):
+        if self.record is None:
+            return
+        self.record['wall_time'] = time.perf_counter() - self.start
+        stack = _stack()
+        stack.pop()
+        if self.tracing and _tracemalloc.is_tracing():
+            self.peak = max(self.peak, _tracemalloc.get_traced_memory()[1])
+            self.record['peak_tracemalloc'] = self.peak - self.memory_start
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+            _tracemalloc.reset_peak()
+        self.record['process_peak_rss'] = peak_rss()
+        for profile in list(_profiles):
+            profile.add(self.record)
+
+def instrumented(name, rows=None):
+    """
+    Decorator recording each call of a function as stage.
+    The number of bytes is the size of a file path passed as first argument.
+    :param name: Name of the stage.
+    :param rows: Function returning the number of rows of the result,
+        default=None counts the rows of a returned pd.DataFrame.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _profiles:
+                return function(*args, **kwargs)
+            with stage(name) as record:
+                if len(args) > 0 and isinstance(args[0], str) and os.path.isfile(args[0]):
+                    record['bytes'] = os.path.getsize(args[0])
+                result = function(*args, **kwargs)
+                record['rows'] = (rows or _count_rows)(result)
+                return result
+        return wrapper
+    return decorator
+
+def _count_rows(result):
+    """ Rows of a returned data frame or of the first data frame in a returned tuple. """
+    for value in (result if isinstance(result, tuple) else (result,)):
+        if hasattr(value, 'shape') and hasattr(value, 'iloc'):
+            return int(value.shape[0])
+    return None
+
+_can_reset_peak = hasattr(_tracemalloc, 'reset_peak') # Python 3.9
+
+def _stack():
+    """ Stack of currently running stages of this thread. """
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+def peak_rss():
+    """ Peak resident set size of the process since its start in bytes, None if unavailable. """
+    try:
+        import resource
+    except ImportError: # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _from_environment(variable='PERSEUSPY_INSTRUMENT'):
+    """ Activate a process-wide profile if the environment variable is set. """
+    value = os.environ.get(variable, '')
+    if value == '' or value == '0':
+        return None
+    if value.lower() in {'1', 'log'}:
+        profile = Profile(log=True)
+    else:
+        profile = Profile(path=value)
+    _profiles.append(profile)
+    return profile
+
+environment_profile = _from_environment()
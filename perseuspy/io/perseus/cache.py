@@ -0,0 +1,169 @@
+"""
+Binary cache for Perseus text matrices.
+
+Parsed matrices are stored in the uncompressed Feather (Arrow IPC) format,
+which is read back using memory mapping. Cache entries are keyed by the path,
+size and modification time of the source file, optionally by its content hash,
+and by the keyword arguments used for reading.
+
+>>> from perseuspy.io.perseus.cache import read_perseus_cached
+>>> df = read_perseus_cached(path, max_size=10 * 1024**3)
+
+Requires `pyarrow`. Without it, the matrix is parsed on every call.
+"""
+import os
+import json
+import hashlib
+import warnings
+import tempfile
+import numpy as np
+import pandas as pd
+from perseuspy.io.perseus.matrix import read_perseus, read_header, _is_list_column
+from perseuspy.io.perseus.multi_numeric import MultiNumericArray
+
+_cache_version = 1
+_cache_suffix = '.feather'
+_metadata_key = b'perseuspy'
+
+def read_perseus_cached(path, cache_dir=None, max_size=None, content_hash=False, **kwargs):
+    """
+    Read a Perseus-formatted matrix through the binary cache, see `read_perseus`.
+
+    :param path: Path to the matrix. File-like objects are read without caching.
+    :param cache_dir: Cache directory, default=None uses '.perseuspy_cache' next to the matrix.
+    :param max_size: Maximal total size of the cache in bytes. Least recently used
+        entries are evicted. default=None does not evict.
+    :param content_hash: Include a hash of the file content in the cache key, default=False.
+    :param kwargs: Keyword arguments passed as-is to `read_perseus`.
+    :returns: The parsed data frame.
+    """
+    if not isinstance(path, str) or kwargs.get('chunksize') is not None:
+        return read_perseus(path, **kwargs)
+    try:
+        import pyarrow
+    except ImportError:
+        warnings.warn('pyarrow is not installed, the Perseus matrix cache is disabled.')
+        return read_perseus(path, **kwargs)
+    cache_dir = default_cache_dir(path) if cache_dir is None else cache_dir
+    cache_file = os.path.join(cache_dir, cache_key(path, content_hash, **kwargs) + _cache_suffix)
+    if os.path.isfile(cache_file):
+        os.utime(cache_file) # mark as recently used
+        return _read_cache_file(cache_file)
+    df = read_perseus(path, **kwargs)
+    annotations, _ = read_header(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_cache_file(cache_file, df, annotations)
+    if max_size is not None:
+        evict(cache_dir, max_size)
+    return df
+
+def default_cache_dir(path):
+    """ The default cache directory '.perseuspy_cache' next to the matrix. """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), '.perseuspy_cache')
+
+def file_identity(path, content_hash=False):
+    """
+    Identity of a file for caching purposes.
+    :param path: Path to the file.
+    :param content_hash: Include the sha1 hash of the file content, default=False.
+    :returns: Tuple of absolute path, size, modification time and content hash or None.
+    """
+    stat = os.stat(path)
+    digest = None
+    if content_hash:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        digest = sha1.hexdigest()
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns, digest
+
+def cache_key(path, content_hash=False, **kwargs):
+    """
+    Cache key of a matrix read with the specified keyword arguments.
+    Keyword arguments are identified by their `repr`.
+    :param path: Path to the matrix.
+    :param content_hash: Include a hash of the file content, default=False.
+    :param kwargs: Keyword arguments passed to `read_perseus`.
+    :returns: Hex digest.
+    """
+    identity = file_identity(path, content_hash)
+    key = repr((_cache_version, identity, sorted((k, repr(v)) for k, v in kwargs.items())))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def evict(cache_dir, max_size):
+    """
+    Remove least recently used cache entries until the total size is within budget.
+    :param cache_dir: Cache directory.
+    :param max_size: Maximal total size in bytes.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(_cache_suffix):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total_size <= max_size:
+            break
+        os.remove(os.path.join(cache_dir, name))
+        total_size -= size
+
+def _write_cache_file(cache_file, df, annotations):
+    """
+    Store the data frame with positional column names. The column index, the
+    annotation rows and the positions of list and categorical 'T' columns are kept in the schema metadata.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    _df = df.copy(deep=False)
+    _df.columns = [str(i) for i in range(_df.shape[1])]
+    lists = [i for i, column in enumerate(_df.columns)
+            if _df[column].dtype == object and _is_list_column(_df[column].values)]
+    for i in lists:
+        _df[str(i)] = MultiNumericArray.from_lists(_df[str(i)].values)
+    columns = df.columns
+    metadata = {
+            'column_names': list(columns.names),
+            'column_levels': [list(columns.get_level_values(i)) for i in range(columns.nlevels)],
+            'annotations': {name: list(values) for name, values in annotations.items()
+                if name not in {'dtype', 'converters'}},
+            'lists': lists,
+            'text_columns': [i for i, column in enumerate(columns) if column in df.attrs.get('perseus_text_columns', ())]}
+    table = pa.Table.from_pandas(_df, preserve_index=None)
+    schema_metadata = dict(table.schema.metadata)
+    schema_metadata[_metadata_key] = json.dumps(metadata).encode('utf-8')
+    table = table.replace_schema_metadata(schema_metadata)
+    fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(cache_file))
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_file, compression='uncompressed')
+        os.replace(tmp_file, cache_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def _read_cache_file(cache_file):
+    """ Memory-map a cache file and restore the data frame. """
+    import pyarrow.feather as feather
+    table = feather.read_table(cache_file, memory_map=True)
+    metadata = json.loads(table.schema.metadata[_metadata_key].decode('utf-8'))
+    df = table.to_pandas()
+    for column in df.columns:
+        if df[column].dtype == object: # Arrow returns None for missing text, the parser NaN
+            df[column] = df[column].where(df[column].notna(), np.nan)
+    for i in metadata['lists']:
+        array = df[str(i)].array # converted in bulk, indexing the array per row is slow
+        values, offsets = array.values.tolist(), array.offsets.tolist()
+        lists = np.empty(len(df), dtype=object)
+        for j, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+            lists[j] = values[start:end]
+        df[str(i)] = lists
+    names, levels = metadata['column_names'], metadata['column_levels']
+    if len(levels) == 1:
+        df.columns = pd.Index(levels[0], name=names[0])
+    else:
+        df.columns = pd.MultiIndex.from_arrays(levels, names=names)
+    if metadata.get('text_columns'):
+        df.attrs['perseus_text_columns'] = frozenset(df.columns[i] for i in metadata['text_columns'])
+    return df
@@ -1,6 +1,13 @@
+import io
+import os
 import numpy as np
 import pandas as pd
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from itertools import chain
+from functools import partial
+from pandas.api.types import union_categoricals
+from perseuspy.io.perseus.multi_numeric import MultiNumericArray, MultiNumericDtype
+from perseuspy.instrumentation import instrumented, stage
 
 separator = '\t'
 def multi_numeric_converter(numbers):
@@ -10,15 +17,121 @@ converters = {'M': multi_numeric_converter}
 
 perseus_to_dtype = {'E' : float, 'T' : str, 'C' : 'category', 'N' : float}
 
-def dtype_to_perseus(dtype):
+def dtype_to_perseus(dtype, source_type=None):
+    """
+    Perseus type of a column.
+    :param dtype: dtype of the column.
+    :param source_type: Perseus type of the column in the file it was read from, default=None.
+        Categoricals read from 'T' columns are kept as 'T'.
+    """
     if type(dtype) is pd.core.dtypes.dtypes.CategoricalDtype:
-        return 'C'
+        return 'T' if source_type == 'T' else 'C'
+    elif type(dtype) is MultiNumericDtype:
+        return 'M'
     else:
-        mapping = {np.dtype('float'): 'N', np.dtype('str'): 'T',
-                   np.dtype('object'): 'T', np.dtype('int64'): 'N',
-                   np.dtype('bool'): 'C'}
-        return mapping[dtype]
+        # by kind, to support all sizes of numeric types and pandas string dtypes
+        mapping = {'f': 'N', 'i': 'N', 'u': 'N',
+                   'O': 'T', 'U': 'T', 'S': 'T',
+                   'b': 'C'}
+        return mapping[dtype.kind]
+
+@instrumented('read_header')
+def read_header(path_or_file, separator='\t', reset=True, encoding='utf-8'):
+    """
+    Read the column names and annotation rows, stopping at the first data row.
+
+    >>> annotations, offset = read_header(path_or_file, separator)
+    >>> with open(path_or_file, 'rb') as f:
+    ...     f.seek(offset) # skip straight to the data
+
+    :param path_or_file: Path or file-like object
+    :param separator: Column separator
+    :param reset: Reset the file after reading. Useful for file-like, no-op for paths.
+    :param encoding: Encoding of binary files, default='utf-8'.
+    :returns: Ordered dictionary of annotations and the position of the first data row.
+        The position is a byte offset for paths and binary files, into the
+        decompressed data for compressed files.
+    """
+    with PathOrFile(path_or_file, 'rb', reset=reset) as f:
+        annotations, offset, _ = _read_header(f, separator, encoding)
+        if offset is not None:
+            f.seek(offset)
+        return annotations, offset
+
+def _read_header(f, separator, encoding='utf-8'):
+    """
+    Parse the header of an open file. Since the end of the header is only known after
+    reading the first data row, this row is returned as well. Works on unseekable files.
+    :param f: Open file in text or binary mode.
+    :param separator: Column separator
+    :param encoding: Encoding of binary files, default='utf-8'.
+    :returns: Ordered dictionary of annotations, the position of the first data row
+        or None for unseekable files, and the first data row.
+    """
+    annotations = OrderedDict({})
+    annotations['Column Name'] = _decode(f.readline(), encoding).strip().split(separator)
+    offset = _tell(f)
+    _line = f.readline()
+    line = _decode(_line, encoding)
+    while line.startswith('#!{'):
+        tokens = line.strip().split(separator)
+        _name, first_value = tokens[0].split('}')
+        name = _name.replace('#!{', '')
+        values = [first_value] + tokens[1:]
+        if name == 'Type':
+            colnames = annotations['Column Name']
+            annotations['dtype'] = {colnames[i]: perseus_to_dtype[x] for i, x in enumerate(values) if x in perseus_to_dtype}
+            annotations['converters'] = {colnames[i]: converters[x] for i, x in enumerate(values) if x in converters}
+        annotations[name] = values
+        offset = _tell(f)
+        _line = f.readline()
+        line = _decode(_line, encoding)
+    return annotations, offset, _line
+
+def _decode(line, encoding='utf-8'):
+    """ decode lines read from binary files, pass text through as-is. """
+    return line.decode(encoding) if isinstance(line, bytes) else line
+
+def _tell(f):
+    """ current position in the file or None if the file is unseekable. """
+    try:
+        return f.tell() if f.seekable() else None
+    except OSError: # includes io.UnsupportedOperation
+        return None
+
+class _PrependedReader(io.IOBase):
+    """Read-only file-like which replays an already consumed line before
+    continuing to read from the underlying file. Allows handing an unseekable
+    stream on to pd.read_csv after parsing its header.
+    :param line: The consumed line.
+    :param f: The underlying file-like."""
+    def __init__(self, line, f):
+        super().__init__()
+        self.line = line
+        self.f = f
+        self.mode = 'rb' if isinstance(line, bytes) else 'r'
 
+    def read(self, size=-1):
+        if not self.line:
+            return self.f.read(size)
+        if size is None or size < 0:
+            data, self.line = self.line + self.f.read(), self.line[:0]
+            return data
+        data, self.line = self.line[:size], self.line[size:]
+        if len(data) < size:
+            data = data + self.f.read(size - len(data))
+        return data
+
+    def readline(self, size=-1):
+        if not self.line:
+            return self.f.readline(size)
+        line, self.line = self.line, self.line[:0]
+        return line
+
+    def readable(self):
+        return True
+
+@instrumented('read_annotations')
 def read_annotations(path_or_file, separator='\t', reset=True):
     """
     Read all annotations from the specified file.
@@ -33,20 +146,7 @@ def read_annotations(path_or_file, separator='\t', reset=True):
     :param reset: Reset the file after reading. Useful for file-like, no-op for paths.
     :returns: Ordered dictionary of annotations.
     """
-    annotations = OrderedDict({})
-    with PathOrFile(path_or_file, 'r', reset=reset) as f:
-        annotations['Column Name'] = f.readline().strip().split(separator)
-        for line in f:
-            if line.startswith('#!{'):
-                tokens = line.strip().split(separator)
-                _name, first_value = tokens[0].split('}')
-                name = _name.replace('#!{', '')
-                values = [first_value] + tokens[1:]
-                if name == 'Type':
-                    colnames = annotations['Column Name']
-                    annotations['dtype'] = {colnames[i]: perseus_to_dtype[x] for i, x in enumerate(values) if x in perseus_to_dtype}
-                    annotations['converters'] = {colnames[i]: converters[x] for i, x in enumerate(values) if x in converters}
-                annotations[name] = values
+    annotations, _ = read_header(path_or_file, separator, reset)
     return annotations
 
 def annotation_rows(prefix, annotations):
@@ -58,6 +158,7 @@ def annotation_rows(prefix, annotations):
             for name, values in annotations.items() if name.startswith(prefix)}
 
 
+@instrumented('create_column_index')
 def create_column_index(annotations):
     """
     Create a pd.MultiIndex using the column names and any categorical rows.
@@ -76,7 +177,9 @@ def create_column_index(annotations):
         column_index = column_index.get_level_values(name)
     return column_index
 
-def read_perseus(path_or_file, **kwargs):
+@instrumented('read_perseus')
+def read_perseus(path_or_file, chunksize=None, multi_numeric='list',
+        float_dtype='float64', text_dtype='object', types=None, where=None, engine=None, workers=None, **kwargs):
     """
     Read a Perseus-formatted matrix into a pd.DataFrame.
     Annotation rows will be converted into a multi-index.
@@ -84,70 +187,689 @@ def read_perseus(path_or_file, **kwargs):
     By monkey-patching the returned pd.DataFrame a `to_perseus`
     method for exporting the pd.DataFrame is made available.
 
+    The input is read in a single pass, so unseekable file-likes such as pipes
+    or `sys.stdin` are supported. Compressed files are decompressed on the fly,
+    see `PathOrFile`.
+
+    If `chunksize` is specified, an iterator over pd.DataFrame chunks is returned
+    instead. All chunks share the same column index. Note that categories of 'C'
+    columns are inferred from each chunk separately. With `text_dtype='auto'` the
+    first chunk decides which 'T' columns are loaded as categoricals.
+
+    >>> for chunk in pd.read_perseus(path_or_file, chunksize=100000):
+    ...     process(chunk)
+
+    Multi-numeric 'M' columns are parsed into lists of floats by default. With
+    `multi_numeric='ragged'` each 'M' column is parsed in bulk into a
+    `MultiNumericArray`, which stores all numbers in one contiguous array.
+
+    Memory use can be reduced with `float_dtype='float32'` for 'E' and 'N' columns
+    and by loading 'T' columns as categoricals or pandas strings. The labels of
+    'T' columns loaded as categoricals are kept in `df.attrs['perseus_text_columns']`,
+    so that `to_perseus` writes them back as 'T' columns.
+
+    >>> df = pd.read_perseus(path_or_file, float_dtype='float32', text_dtype='auto')
+
+    Columns can be selected by name or position with `usecols`, by Perseus type with
+    `types` and by annotation row values with `where`, see `select_columns`. Unselected
+    columns are skipped by the parser.
+
+    >>> df = pd.read_perseus(path_or_file, types={'E'}, where={'C:Group': 'treated'})
+
+    With `engine='pyarrow'` the data rows are parsed by the multithreaded Arrow CSV
+    reader if pyarrow is installed. It falls back to the pandas parser for chunked
+    reading, text file-likes, converters (including 'M' columns with
+    `multi_numeric='list'`) and any other pandas.read_csv keyword arguments.
+    Arrow parses numbers with correct rounding, as does the pandas fallback of
+    `engine='pyarrow'` with `float_precision='round_trip'`. The faster default
+    parsers of the 'c' and 'python' engines can differ from the correctly rounded
+    value by one ULP, pass `float_precision='round_trip'` to the 'c' engine for
+    results identical to Arrow.
+
+    With `workers` the data section of an uncompressed file path is split into
+    byte ranges at line boundaries, which are parsed in a process pool. Fields
+    must not contain quoted newlines and custom converters have to be picklable.
+    Row-selecting keyword arguments such as `nrows` or `skiprows` cannot be applied
+    to each range separately, in which case the file is read serially.
+
+    >>> df = pd.read_perseus(path, workers=8)
+
     :param path_or_file: File path or file-like object
+    :param chunksize: Number of rows per chunk, default=None reads the whole matrix.
+    :param multi_numeric: Representation of 'M' columns, either 'list' or 'ragged', default='list'.
+    :param float_dtype: Dtype of 'E' and 'N' columns, e.g. 'float32', default='float64'.
+    :param text_dtype: Dtype of 'T' columns. Either 'object', 'category', 'string' (Arrow-backed
+        if pyarrow is installed), or 'auto' for categories if at most half the values are unique. default='object'.
+    :param types: Set of Perseus types of the columns to read, e.g. {'E', 'C'}, default=None reads all.
+    :param where: Dictionary of annotation row name -> value(s) or predicate, default=None reads all.
+    :param engine: Parser engine, 'c', 'python' or 'pyarrow', default=None uses the pandas default.
+    :param workers: Number of worker processes for parsing a file path in parallel, default=None.
     :param kwargs: Keyword arguments passed as-is to pandas.read_csv
-    :returns: The parsed data frame
+    :returns: The parsed data frame or an iterator over chunks
+    """
+    options = {'multi_numeric': multi_numeric, 'float_dtype': float_dtype, 'text_dtype': text_dtype,
+            'types': types, 'where': where}
+    if chunksize is not None:
+        if engine is not None and engine != 'pyarrow':
+            kwargs['engine'] = engine
+        return _read_perseus_chunks(path_or_file, chunksize, options, **kwargs)
+    if workers is not None and workers > 1 and isinstance(path_or_file, str) and set(kwargs) <= _range_kwargs:
+        df = _read_perseus_parallel(path_or_file, workers, engine, options, kwargs)
+        if df is not None:
+            return df
+    with PathOrFile(path_or_file, 'rb') as f:
+        with stage('header'):
+            annotations, _, first_line = _read_header(f, separator, kwargs.get('encoding', 'utf-8'))
+            column_index, kwargs, postprocess = _read_csv_kwargs(annotations, kwargs, **options)
+        with stage('parse', engine=engine) as record:
+            data = _PrependedReader(first_line, f)
+            df = _read_csv(data, engine, kwargs)
+            record['rows'] = len(df)
+    with stage('columns'):
+        return _set_columns(df, column_index, postprocess, annotations.get('Type', []))
+
+def _read_csv(data, engine, kwargs):
+    """
+    Parse the data rows with pandas or, if possible, with the Arrow CSV reader.
+    :param data: File-like positioned at the first data row.
+    :param engine: Parser engine, 'c', 'python', 'pyarrow' or None.
+    :param kwargs: Keyword arguments for pd.read_csv as created by `_read_csv_kwargs`.
+    :returns: The parsed data frame with positional column names.
     """
-    annotations = read_annotations(path_or_file, separator)
+    if engine == 'pyarrow':
+        column_types = _arrow_column_types(kwargs)
+        if column_types is not None and not isinstance(getattr(data, 'line', b''), str):
+            try:
+                return _read_csv_arrow(data, kwargs, column_types)
+            except _EmptyData: # no data rows, which Arrow rejects
+                data = io.BytesIO(b'')
+        engine = None
+        kwargs = dict(kwargs, float_precision=kwargs.get('float_precision', 'round_trip')) # rounds like Arrow
+    if engine is not None:
+        kwargs = dict(kwargs, engine=engine)
+    return pd.read_csv(data, sep=separator, **kwargs)
+
+# default missing values of pandas.read_csv
+_na_values = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+        '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null']
+_arrow_kwargs = {'header', 'names', 'dtype', 'converters', 'usecols', 'float_precision'}
+def _arrow_column_types(kwargs):
+    """
+    Arrow types for the dtypes of `kwargs`, or None if the Arrow reader cannot
+    produce the same result as pd.read_csv, i.e. if pyarrow is not installed or
+    converters or unsupported keyword arguments are specified.
+    :returns: Dictionary of column position -> (arrow type, dtype).
+    """
+    if len(kwargs['converters']) > 0 or len(set(kwargs) - _arrow_kwargs) > 0:
+        return None
+    if kwargs.get('float_precision', 'round_trip') != 'round_trip': # Arrow rounds correctly
+        return None
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    column_types = {}
+    for i, dtype in kwargs['dtype'].items():
+        if dtype is str or dtype is object:
+            column_types[i] = pa.string(), np.dtype('object')
+        elif dtype == 'category':
+            column_types[i] = pa.dictionary(pa.int32(), pa.string()), 'category'
+        elif isinstance(dtype, str) and dtype.startswith('string'):
+            column_types[i] = pa.string(), dtype
+        else:
+            try:
+                column_types[i] = pa.from_numpy_dtype(np.dtype(dtype)), np.dtype(dtype)
+            except (TypeError, pa.ArrowNotImplementedError):
+                return None
+    return column_types
+
+class _EmptyData(Exception):
+    """ Raised by `_read_csv_arrow` if there are no data rows. """
+
+def _read_csv_arrow(data, kwargs, column_types):
+    """
+    Parse the data rows with the multithreaded Arrow CSV reader.
+    The result is converted to match pd.read_csv with the same keyword arguments.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as csv
+    names = [str(i) for i in kwargs['names']]
+    usecols = kwargs.get('usecols')
+    if usecols is not None and len(usecols) == 0: # Arrow would include all columns
+        return pd.DataFrame()
+    include_columns = names if usecols is None else [names[i] for i in usecols]
+    try:
+        table = csv.read_csv(data,
+                read_options=csv.ReadOptions(column_names=names, use_threads=True),
+                parse_options=csv.ParseOptions(delimiter=separator),
+                convert_options=csv.ConvertOptions(
+                    column_types={names[i]: arrow_type for i, (arrow_type, _) in column_types.items()},
+                    include_columns=include_columns,
+                    null_values=_na_values, strings_can_be_null=True))
+    except pa.ArrowInvalid as e:
+        if 'Empty CSV' in str(e):
+            raise _EmptyData()
+        raise
+    df = table.to_pandas()
+    df.columns = [int(name) for name in df.columns]
+    for i, arrow_type in zip(df.columns, table.schema.types):
+        dtype = column_types.get(i, (None, None))[1]
+        if pa.types.is_null(arrow_type): # empty columns
+            df[i] = np.full(len(df), np.nan) if dtype is None else pd.Series(np.nan, index=df.index).astype(dtype)
+        elif pa.types.is_string(arrow_type) and dtype in (None, np.dtype('object')):
+            df[i] = df[i].where(df[i].notna(), np.nan) # None -> NaN
+        elif pa.types.is_dictionary(arrow_type): # pandas sorts categories
+            df[i] = df[i].cat.reorder_categories(sorted(df[i].cat.categories))
+        elif pa.types.is_string(arrow_type):
+            df[i] = df[i].astype(dtype)
+    return df
+
+def _read_perseus_chunks(path_or_file, chunksize, options, **kwargs):
+    """
+    Generator over chunks of a Perseus-formatted matrix, see `read_perseus`.
+    The file is kept open until the generator is exhausted or closed.
+    """
+    with PathOrFile(path_or_file, 'rb') as f:
+        annotations, _, first_line = _read_header(f, separator, kwargs.get('encoding', 'utf-8'))
+        column_index, kwargs, postprocess = _read_csv_kwargs(annotations, kwargs, **options)
+        postprocess.update((i, _ChunkedAutoCategory()) for i, function in postprocess.items() if function is _auto_category)
+        data = _PrependedReader(first_line, f)
+        for chunk in pd.read_csv(data, sep=separator, chunksize=chunksize, **kwargs):
+            yield _set_columns(chunk, column_index, postprocess, annotations.get('Type', []))
+
+# pandas.read_csv keyword arguments which act on each row or column independently
+_range_kwargs = {'usecols', 'dtype', 'converters', 'true_values', 'false_values', 'na_values',
+        'keep_default_na', 'na_filter', 'decimal', 'thousands', 'float_precision', 'quotechar',
+        'quoting', 'doublequote', 'escapechar', 'encoding', 'low_memory', 'memory_map'}
+
+def _read_perseus_parallel(path, workers, engine, options, kwargs):
+    """
+    Parse byte ranges of the data section in a process pool, see `read_perseus`.
+    :returns: The data frame or None if the file cannot be split, e.g. if it is compressed.
+    """
+    with open(path, 'rb') as f:
+        if _detect_compression(f) is not None:
+            return None
+    annotations, start = read_header(path, encoding=kwargs.get('encoding', 'utf-8'))
+    ranges = _byte_ranges(path, start, workers)
+    if len(ranges) < 2:
+        return None
+    column_index, kwargs, postprocess = _read_csv_kwargs(annotations, kwargs, **options)
+    read_range = partial(_read_byte_range, path, engine=engine, kwargs=kwargs)
+    from concurrent.futures import ProcessPoolExecutor
+    with stage('parse', engine=engine, workers=len(ranges)):
+        with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+            chunks = list(executor.map(read_range, *zip(*ranges)))
+    with stage('columns'):
+        return _set_columns(_concat_chunks(chunks), column_index, postprocess, annotations.get('Type', []))
+
+def _byte_ranges(path, start, n):
+    """
+    Split the file after `start` into at most `n` byte ranges at line boundaries.
+    :returns: List of (start, end) tuples.
+    """
+    end = os.path.getsize(path)
+    boundaries = [start]
+    with open(path, 'rb') as f:
+        for i in range(1, n):
+            f.seek(max(start + (end - start) * i // n - 1, boundaries[-1]))
+            f.readline() # a boundary right at the start of a line is kept
+            boundary = f.tell()
+            if boundaries[-1] < boundary < end:
+                boundaries.append(boundary)
+    if end > boundaries[-1]:
+        boundaries.append(end)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def _read_byte_range(path, start, end, engine, kwargs):
+    """ Parse the rows between two byte offsets with positional column names. """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = io.BytesIO(f.read(end - start))
+    return _read_csv(data, engine, kwargs)
+
+def _concat_chunks(chunks):
+    """ Concatenate the rows of parsed chunks. Categories of categorical columns are merged. """
+    df = pd.concat(chunks, ignore_index=True)
+    for i in df.columns:
+        columns = [chunk[i] for chunk in chunks]
+        if all(isinstance(column.dtype, pd.CategoricalDtype) for column in columns):
+            df[i] = union_categoricals(columns, sort_categories=True)
+    return df
+
+def read_perseus_many(paths, workers=None, concat=False, **kwargs):
+    """
+    Read multiple Perseus-formatted matrices in parallel, see `read_perseus`.
+    Each file is parsed in a separate worker process.
+
+    >>> dfs = pd.read_perseus_many(paths, workers=4, float_dtype='float32')
+
+    :param paths: Sequence of file paths.
+    :param workers: Maximal number of worker processes, default=None uses the number of CPUs.
+        With `workers=1` the files are read serially in the current process.
+    :param concat: Concatenate the rows of all matrices into a single pd.DataFrame, default=False.
+        Columns are aligned by their column index, i.e. by the column names and all annotation rows.
+    :param kwargs: Keyword arguments passed as-is to `read_perseus`, except for `chunksize`.
+    :returns: List of data frames in the order of `paths` or the concatenated data frame.
+    """
+    if kwargs.get('chunksize') is not None:
+        raise ValueError('Reading multiple matrices in chunks is not supported.')
+    paths = list(paths)
+    workers = min(workers or os.cpu_count() or 1, max(len(paths), 1))
+    if workers == 1:
+        dfs = [read_perseus(path, **kwargs) for path in paths]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            dfs = list(executor.map(partial(read_perseus, **kwargs), paths))
+    if concat:
+        return pd.concat(dfs, ignore_index=True) if len(dfs) > 0 else pd.DataFrame()
+    return dfs
+
+def select_columns(annotations, usecols=None, types=None, where=None):
+    """
+    Resolve a column selection from the header alone. All criteria have to be met.
+
+    >>> annotations, _ = read_header(path_or_file)
+    >>> positions = select_columns(annotations, types={'E'}, where={'C:Group': {'treated', 'control'}})
+
+    :param annotations: Annotations as returned by `read_header`.
+    :param usecols: Column names or positions, or a predicate on the column name.
+        All columns of a duplicated name are selected. default=None
+    :param types: Set of Perseus types, e.g. {'E', 'C'}. default=None
+    :param where: Dictionary of annotation row name, e.g. 'C:Group', to a value, a collection
+        of values or a predicate. Values are compared to the text of the annotation row. default=None
+    :returns: Sorted list of column positions or None if no criterion was specified.
+    """
+    if usecols is None and types is None and where is None:
+        return None
+    column_names = annotations['Column Name']
+    selected = [True] * len(column_names)
+    if usecols is not None:
+        if callable(usecols):
+            selected = [usecols(name) for name in column_names]
+        else:
+            positions = {}
+            for i, name in enumerate(column_names):
+                positions.setdefault(name, []).append(i)
+            usecols = list(usecols)
+            missing = [x for x in usecols if not isinstance(x, (int, np.integer)) and x not in positions]
+            if len(missing) > 0:
+                raise ValueError('Columns not found: {}'.format(', '.join(str(x) for x in missing)))
+            invalid = [x for x in usecols if isinstance(x, (int, np.integer)) and not 0 <= x < len(column_names)]
+            if len(invalid) > 0:
+                raise ValueError('Column positions out of range for {} columns: {}'.format(
+                    len(column_names), ', '.join(str(x) for x in invalid)))
+            _selected = set()
+            for x in usecols:
+                _selected.update([int(x)] if isinstance(x, (int, np.integer)) else positions[x])
+            selected = [i in _selected for i in range(len(column_names))]
+    if types is not None:
+        types = set(types)
+        column_types = _padded(annotations.get('Type', []), len(column_names))
+        selected = [keep and x in types for keep, x in zip(selected, column_types)]
+    for name, condition in (where or {}).items():
+        if name not in annotations:
+            raise ValueError('Annotation row not found: {}'.format(name))
+        if callable(condition):
+            match = condition
+        elif isinstance(condition, (set, frozenset, list, tuple)):
+            match = set(condition).__contains__
+        else:
+            match = lambda x, value=condition: x == value
+        values = _padded(annotations[name], len(column_names))
+        selected = [keep and bool(match(x)) for keep, x in zip(selected, values)]
+    return [i for i, keep in enumerate(selected) if keep]
+
+def _padded(values, n):
+    """ pad annotation row values with '' to the number of columns """
+    return list(values) + [''] * (n - len(values))
+
+_text_dtypes = {'object', 'category', 'string', 'auto'}
+def _read_csv_kwargs(annotations, kwargs, multi_numeric='list', float_dtype='float64', text_dtype='object',
+        types=None, where=None):
+    """
+    Create the column index and the keyword arguments for pd.read_csv, which
+    parses the data rows with positional column names.
+    :param annotations: Annotations as returned by `read_header`.
+    :param kwargs: Keyword arguments passed to `read_perseus`.
+    :param multi_numeric: Representation of 'M' columns, either 'list' or 'ragged'.
+    :param float_dtype: Dtype of 'E' and 'N' columns.
+    :param text_dtype: Dtype of 'T' columns, one of 'object', 'category', 'string' or 'auto'.
+    :param types: Set of Perseus types of the columns to read, see `select_columns`.
+    :param where: Annotation row values of the columns to read, see `select_columns`.
+    :returns: The column index, keyword arguments for pd.read_csv and a dictionary
+        of column position -> function applied to the parsed column values.
+    """
+    if multi_numeric not in {'list', 'ragged'}:
+        raise ValueError("multi_numeric has to be either 'list' or 'ragged', was {}.".format(multi_numeric))
+    if text_dtype not in _text_dtypes:
+        raise ValueError('text_dtype has to be one of {}, was {}.'.format(', '.join(sorted(_text_dtypes)), text_dtype))
+    kwargs = dict(kwargs)
     column_index = create_column_index(annotations)
-    if 'usecols' in kwargs:
-	    usecols = kwargs['usecols']
-	    if type(usecols[0]) is str:
-		    usecols = sorted([list(column_index).index(x) for x in usecols])
-	    column_index = column_index[usecols]
-    kwargs['dtype'] = dict(kwargs.get('dtype', {}), **annotations.get('dtype', {}))
-    kwargs['converters'] = dict(kwargs.get('converters', {}), **annotations.get('converters', {}))
-    df = pd.read_csv(path_or_file, sep=separator, comment='#', **kwargs)
+    column_names = annotations['Column Name']
+    usecols = select_columns(annotations, kwargs.pop('usecols', None), types, where)
+    if usecols is not None:
+        kwargs['usecols'] = usecols
+        column_index = column_index[usecols]
+    types = annotations.get('Type', [])
+    type_to_dtype = dict(perseus_to_dtype, E=float_dtype, N=float_dtype, T=_text_read_dtype(text_dtype))
+    kwargs['dtype'] = _by_position(kwargs.get('dtype', {}), column_names)
+    kwargs['dtype'].update((i, type_to_dtype[x]) for i, x in enumerate(types) if x in type_to_dtype)
+    kwargs['converters'] = _by_position(kwargs.get('converters', {}), column_names)
+    postprocess = {}
+    if multi_numeric == 'ragged':
+        ragged = [i for i, x in enumerate(types) if x == 'M']
+        kwargs['dtype'].update((i, str) for i in ragged)
+        postprocess.update((i, MultiNumericArray.from_strings) for i in ragged)
+    else:
+        kwargs['converters'].update((i, converters[x]) for i, x in enumerate(types) if x in converters)
+    if text_dtype == 'auto':
+        postprocess.update((i, _auto_category) for i, x in enumerate(types) if x == 'T')
+    if usecols is not None: # unselected positions are misinterpreted by the python engine
+        selected = set(usecols)
+        for name in ['dtype', 'converters']:
+            kwargs[name] = {i: value for i, value in kwargs[name].items() if i in selected}
+    kwargs['header'] = None
+    kwargs['names'] = range(len(column_names))
+    return column_index, kwargs, postprocess
+
+def _text_read_dtype(text_dtype):
+    """ dtype passed to pd.read_csv for 'T' columns. """
+    if text_dtype == 'category':
+        return 'category'
+    if text_dtype == 'string':
+        try:
+            import pyarrow
+            return 'string[pyarrow]'
+        except ImportError:
+            return 'string'
+    return str
+
+_auto_category_ratio = 0.5
+def _auto_category(values, ratio=_auto_category_ratio):
+    """ Convert text values to a categorical if at most `ratio` of them are unique. """
+    categorical = pd.Categorical(values)
+    if len(categorical.categories) <= ratio * len(values):
+        return categorical
+    return values
+
+class _ChunkedAutoCategory():
+    """ `_auto_category` deciding on the first chunk, so that all chunks of a column share its dtype. """
+    def __init__(self):
+        self.categorical = None
+
+    def __call__(self, values):
+        if self.categorical is None:
+            values = _auto_category(values)
+            self.categorical = isinstance(values, pd.Categorical)
+            return values
+        return pd.Categorical(values) if self.categorical else values
+
+def _set_columns(df, column_index, postprocess, types=()):
+    """
+    Finish a data frame parsed by pd.read_csv with positional column names.
+    :param df: The parsed data frame.
+    :param column_index: The column index.
+    :param postprocess: Dictionary of column position -> function applied to the column values.
+    :param types: Perseus types of all columns in the file. The labels of categorical 'T'
+        columns are stored in `df.attrs['perseus_text_columns']`.
+    :returns: The data frame.
+    """
+    for i, function in postprocess.items():
+        if i in df.columns:
+            df[i] = function(df[i].values)
+    text_columns = frozenset(column for i, column in zip(df.columns, column_index)
+            if i < len(types) and types[i] == 'T' and isinstance(df[i].dtype, pd.CategoricalDtype))
+    if text_columns:
+        df.attrs['perseus_text_columns'] = text_columns
     df.columns = column_index
     return df
 
-import numpy as np
+def _by_position(mapping, column_names):
+    """
+    Re-key a column name -> value mapping by column position. Integer keys are kept as-is.
+    :param mapping: Dictionary with column names or positions as keys.
+    :param column_names: List of all column names.
+    :returns: Dictionary with column positions as keys.
+    """
+    positions = {}
+    for i, name in enumerate(column_names):
+        positions.setdefault(name, []).append(i)
+    result = {}
+    for key, value in mapping.items():
+        for i in ([key] if isinstance(key, int) else positions.get(key, [])):
+            result[i] = value
+    return result
+
 def to_perseus(df, path_or_file, main_columns=None,
         separator=separator,
         convert_bool_to_category=True,
-        numerical_annotation_rows = set([])):
+        numerical_annotation_rows = set([]),
+        chunksize=100000,
+        float_format=None,
+        workers=None):
     """
     Save pd.DataFrame to Perseus text format.
 
+    The data frame is never copied. Bool and multi-numeric columns are converted
+    to text separately for each chunk of rows.
+
+    With `workers` chunks of rows are formatted in a process pool and written
+    in order. The output is identical to the serial export.
+
+    >>> df.to_perseus(path_or_file, float_format='%.6g', workers=4)
+
     :param df: pd.DataFrame.
-    :param path_or_file: File name or file-like object.
+    :param path_or_file: File name or file-like object. File names ending in '.gz', '.bz2', '.xz'
+        or '.zst' are compressed accordingly.
     :param main_columns: Main columns. Will be infered if set to None. All numeric columns up-until the first non-numeric column are considered main columns.
     :param separator: For separating fields, default='\t'.
     :param covert_bool_to_category: Convert bool columns of True/False to category columns '+'/'', default=True.
     :param numerical_annotation_rows: Set of column names to be interpreted as numerical annotation rows, default=set([]).
+    :param chunksize: Number of rows converted at once if bool or multi-numeric columns are present, default=100000.
+    :param float_format: Format string for floating point numbers, e.g. '%.6g', default=None writes all digits.
+    :param workers: Number of worker processes formatting chunks of rows, default=None formats serially.
     """
-    _df = df.copy()
-    if not _df.columns.name:
-        _df.columns.name = 'Column Name'
-    column_names = _df.columns.get_level_values('Column Name')
-    annotations = {}
-    main_columns = _infer_main_columns(_df) if main_columns is None else main_columns
-    annotations['Type'] = ['E' if column_names[i] in main_columns else dtype_to_perseus(dtype)
-            for i, dtype in enumerate(_df.dtypes)]
-    # detect multi-numeric columns
-    for i, column in enumerate(_df.columns):
-        valid_values = [value for value in _df[column] if value is not None]
-        if len(valid_values) > 0 and all(type(value) is list for value in valid_values):
+    with stage('to_perseus', workers=workers) as record:
+        with PerseusWriter(path_or_file, main_columns, separator,
+                convert_bool_to_category, numerical_annotation_rows, chunksize, float_format, workers) as writer:
+            writer.write(df)
+        record['rows'] = len(df)
+        if isinstance(path_or_file, str):
+            record['bytes'] = os.path.getsize(path_or_file)
+
+class PerseusWriter():
+    """
+    Incrementally save pd.DataFrame chunks to Perseus text format.
+    The column names and annotation rows are written together with the first chunk.
+    All following chunks have to match the columns and dtypes of the first chunk.
+
+    >>> with PerseusWriter(path_or_file) as writer:
+    ...     for chunk in pd.read_perseus(infile, chunksize=100000):
+    ...         writer.write(chunk)
+
+    :param path_or_file: File name or file-like object.
+    :param main_columns: Main columns. Will be infered from the first chunk if set to None.
+    :param separator: For separating fields, default='\t'.
+    :param covert_bool_to_category: Convert bool columns of True/False to category columns '+'/'', default=True.
+    :param numerical_annotation_rows: Set of column names to be interpreted as numerical annotation rows, default=set([]).
+    :param chunksize: Number of rows converted at once if bool or multi-numeric columns are present,
+        and number of rows per work item for parallel formatting, default=100000.
+    :param float_format: Format string for floating point numbers, e.g. '%.6g', default=None writes all digits.
+    :param workers: Number of worker processes formatting chunks of rows, default=None formats serially.
+    """
+    def __init__(self, path_or_file, main_columns=None,
+            separator=separator,
+            convert_bool_to_category=True,
+            numerical_annotation_rows = set([]),
+            chunksize=100000,
+            float_format=None,
+            workers=None):
+        self.main_columns = main_columns
+        self.separator = separator
+        self.convert_bool_to_category = convert_bool_to_category
+        self.numerical_annotation_rows = numerical_annotation_rows
+        self.chunksize = chunksize
+        self.float_format = float_format
+        self.workers = workers
+        self.executor = None
+        self.columns = None
+        self.dtypes = None
+        self.multi_numeric_columns = None
+        self.converters = None
+        self._path_or_file = PathOrFile(path_or_file, 'w')
+        self.f = self._path_or_file.__enter__()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Close the underlying file and stop the worker processes. No-op for file-likes. """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.f is not None:
+            self._path_or_file.__exit__()
+            self.f = None
+
+    def write(self, df):
+        """
+        Write a pd.DataFrame chunk. The first chunk determines the annotation rows.
+        :param df: pd.DataFrame.
+        """
+        if self.columns is None:
+            self._write_header(df)
+        else:
+            self._check_schema(df)
+        if self.workers is not None and self.workers > 1 and len(df) > self.chunksize:
+            self._write_parallel(df)
+        elif len(self.converters) == 0:
+            df.to_csv(self.f, header=None, index=False, sep=self.separator, float_format=self.float_format)
+        else:
+            for start in range(0, len(df), self.chunksize):
+                _format_rows(df.iloc[start:start + self.chunksize], self.converters,
+                        self.separator, self.float_format, self.f)
+
+    def _write_parallel(self, df):
+        """ Format chunks of rows in worker processes, keeping at most two chunks per worker in flight. """
+        if self.executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        format_rows = partial(_format_rows, converters=self.converters,
+                separator=self.separator, float_format=self.float_format)
+        pending = deque()
+        for start in range(0, len(df), self.chunksize):
+            pending.append(self.executor.submit(format_rows, df.iloc[start:start + self.chunksize]))
+            if len(pending) >= 2 * self.workers:
+                self.f.write(pending.popleft().result())
+        while pending:
+            self.f.write(pending.popleft().result())
+
+    def _write_header(self, df):
+        columns = df.columns.copy()
+        if not columns.name:
+            columns.name = 'Column Name'
+        column_names = columns.get_level_values('Column Name')
+        annotations = {}
+        main_columns = _infer_main_columns(df, columns.names.index('Column Name')) if self.main_columns is None else self.main_columns
+        main_columns = set(main_columns)
+        dtypes = list(df.dtypes)
+        text_columns = df.attrs.get('perseus_text_columns', ())
+        annotations['Type'] = ['E' if name in main_columns else dtype_to_perseus(dtype, 'T' if column in text_columns else None)
+                for name, column, dtype in zip(column_names, df.columns, dtypes)]
+        # detect multi-numeric columns, only object columns can hold lists
+        self.multi_numeric_columns = [i for i, dtype in enumerate(dtypes)
+                if type(dtype) is MultiNumericDtype or (dtype == np.dtype('object') and _is_list_column(df.iloc[:, i].values))]
+        self.converters = {}
+        for i in self.multi_numeric_columns:
             annotations['Type'][i] = 'M'
-            _df[column] = _df[column].apply(lambda xs: ';'.join(str(x) for x in xs))
-    if convert_bool_to_category:
-        for i, column in enumerate(_df.columns):
-            if _df.dtypes[i] is np.dtype('bool'):
-                values = _df[column].values
-                _df[column][values] = '+'
-                _df[column][~values] = ''
-    annotation_row_names = set(_df.columns.names) - {'Column Name'}
-    for name in annotation_row_names:
-        annotation_type = 'N' if name in numerical_annotation_rows else 'C'
-        annotations['{}:{}'.format(annotation_type, name)] = _df.columns.get_level_values(name)
-    with PathOrFile(path_or_file, 'w') as f:
-        f.write(separator.join(column_names) + '\n')
+            self.converters[i] = _ragged_to_strings if type(dtypes[i]) is MultiNumericDtype else _join_lists
+        if self.convert_bool_to_category:
+            self.converters.update((i, _bool_to_category) for i, dtype in enumerate(dtypes) if dtype == np.dtype('bool'))
+        annotation_row_names = set(columns.names) - {'Column Name'}
+        for name in annotation_row_names:
+            annotation_type = 'N' if name in self.numerical_annotation_rows else 'C'
+            annotations['{}:{}'.format(annotation_type, name)] = columns.get_level_values(name)
+        self.f.write(self.separator.join(column_names) + '\n')
         for name, values in annotations.items():
-            f.write('#!{{{name}}}{values}\n'.format(name=name, values=separator.join([str(x) for x in values])))
-        _df.to_csv(f, header=None, index=False, sep=separator)
+            self.f.write('#!{{{name}}}{values}\n'.format(name=name, values=self.separator.join([str(x) for x in values])))
+        self.columns = df.columns
+        self.dtypes = _schema_dtypes(df)
+
+    def _check_schema(self, df):
+        if not df.columns.equals(self.columns):
+            raise ValueError('Columns of the chunk do not match the columns of the first chunk.')
+        dtypes = _schema_dtypes(df)
+        if dtypes != self.dtypes:
+            mismatch = [str(column) for column, a, b in zip(df.columns, self.dtypes, dtypes) if a != b]
+            raise ValueError('Dtypes of the chunk do not match the first chunk for columns: {}'.format(', '.join(mismatch)))
+
+def _format_rows(df, converters, separator, float_format, f=None):
+    """
+    Format a chunk of rows as text. Converted columns are replaced in a copy of the chunk.
+    :param df: pd.DataFrame chunk.
+    :param converters: Dictionary of column position -> function converting the column values.
+    :param f: File-like to write to, default=None returns the text.
+    """
+    if len(converters) > 0:
+        df = df.copy()
+        df.columns = range(df.shape[1]) # positional, column names might be duplicated
+        for i, converter in converters.items():
+            df[i] = converter(df[i].values)
+    return df.to_csv(f, header=None, index=False, sep=separator, float_format=float_format)
+
+def _is_list_column(values):
+    """
+    Check if all values which are not None are lists. Fails fast on the first
+    value for non-list columns.
+    :param values: np.ndarray of objects.
+    """
+    for value in values:
+        if value is not None:
+            if type(value) is not list:
+                return False
+            break
+    else:
+        return False
+    return set(map(type, values)) <= {list, type(None)}
+
+def _join_lists(values, separator=';'):
+    """
+    Join each list of numbers into a string. All numbers are formatted in bulk.
+    :param values: Sequence of lists, None is treated as an empty list.
+    :param separator: Separator between numbers, default=';'.
+    :returns: List of strings.
+    """
+    values = [() if xs is None else xs for xs in values]
+    tokens = list(map(str, chain.from_iterable(values)))
+    ends = np.cumsum(list(map(len, values)), dtype=np.int64).tolist()
+    return [separator.join(tokens[start:end]) for start, end in zip([0] + ends[:-1], ends)]
+
+def _ragged_to_strings(values):
+    return values.to_strings()
+
+def _bool_to_category(values):
+    return np.where(values, '+', '')
+
+def _schema_dtypes(df):
+    """
+    Dtypes of a data frame which have to agree between chunks. Integer and float columns
+    are considered equal since missing values turn integer columns into float columns.
+    Categorical columns are compared regardless of their categories.
+    """
+    return ['category' if str(dtype) == 'category' else 'numeric' if dtype.kind in 'iuf' else dtype.kind
+            for dtype in df.dtypes]
 
 class PathOrFile():
-    """Small context manager for file paths or file-like objects
+    """Small context manager for file paths or file-like objects.
+    gzip, bz2, xz and zstd (requires `zstandard`) compressed files are handled
+    transparently. When reading, the compression is detected from the magic bytes,
+    for binary file-likes only if they are seekable or support `peek`. When writing
+    to a path, the compression is chosen by its extension, e.g. '.gz'.
     :param path_or_file: Path to a file or file-like object
     :param mode: Set reading/writing mode
     :param reset: Reset file-like to initial position. Has no effect on path."""
@@ -161,11 +883,19 @@ class PathOrFile():
 
     def __enter__(self):
         if self.isPath:
-            self.open_file = open(self.path_or_file, self.mode)
+            if 'r' in self.mode:
+                with open(self.path_or_file, 'rb') as f:
+                    compression = _detect_compression(f)
+            else:
+                compression = compression_by_extension(self.path_or_file)
+            self.open_file = _open(self.path_or_file, self.mode, compression)
             return self.open_file
-        else:
-            self.open_file = None
-            return self.path_or_file
+        compression = _detect_compression(self.path_or_file) if self.mode == 'rb' else None
+        if compression is not None: # closing the decompressor leaves the file-like open
+            self.open_file = _open(self.path_or_file, self.mode, compression)
+            return self.open_file
+        self.open_file = None
+        return self.path_or_file
 
     def __exit__(self, *args):
         if self.open_file:
@@ -173,6 +903,71 @@ class PathOrFile():
         if self.reset:
             self.path_or_file.seek(self.position)
 
+_magic_bytes = OrderedDict([
+    ('gzip', b'\x1f\x8b'),
+    ('bz2', b'BZh'),
+    ('xz', b'\xfd7zXZ\x00'),
+    ('zstd', b'\x28\xb5\x2f\xfd')])
+compression_extensions = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz', 'zstd': '.zst'}
+
+def compression_by_extension(path):
+    """
+    Compression of a file as indicated by its extension.
+    :param path: Path to the file.
+    :returns: One of 'gzip', 'bz2', 'xz', 'zstd' or None.
+    """
+    for compression, extension in compression_extensions.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+def _detect_compression(f):
+    """ Compression of a binary file-like detected from its magic bytes, without consuming them. """
+    n = max(len(magic) for magic in _magic_bytes.values())
+    if hasattr(f, 'peek'):
+        start = f.peek(n)[:n]
+    elif f.seekable():
+        position = f.tell()
+        start = f.read(n)
+        f.seek(position)
+    else:
+        return None
+    if not isinstance(start, bytes):
+        return None
+    for compression, magic in _magic_bytes.items():
+        if start.startswith(magic):
+            return compression
+    return None
+
+def _open(path_or_file, mode, compression=None):
+    """
+    Open a path or wrap a file-like, (de-)compressing it on the fly.
+    :param path_or_file: Path or binary file-like.
+    :param mode: Reading/writing mode, text mode unless 'b' is specified.
+    :param compression: One of 'gzip', 'bz2', 'xz', 'zstd' or None.
+    """
+    if compression is None:
+        return open(path_or_file, mode)
+    if 'b' not in mode and 't' not in mode:
+        mode = mode + 't'
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path_or_file, mode)
+    if compression == 'bz2':
+        import bz2
+        return bz2.open(path_or_file, mode)
+    if compression == 'xz':
+        import lzma
+        return lzma.open(path_or_file, mode)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('Reading and writing zstd compressed files requires the zstandard package.')
+        f = zstandard.open(path_or_file, mode, closefd=isinstance(path_or_file, str))
+        return io.BufferedReader(f) if mode == 'rb' else f # supports readline
+    raise ValueError('Unknown compression {}.'.format(compression))
+
 _numeric_dtypes = {np.dtype('float32'), np.dtype('float64'), np.dtype('int32'), np.dtype('int64')}
 def _infer_main_columns(df, index_level='Column Name', numeric_dtypes=_numeric_dtypes):
     """
@@ -192,12 +987,19 @@ def _infer_main_columns(df, index_level='Column Name', numeric_dtypes=_numeric_d
     return main_columns
 
 def main_df(infile, df):
-    annotations = read_annotations(infile)
-    main_index = []
-    i = 0
-    for c_type in annotations['Type']:
-        if c_type == 'E':
-            main_index.append(i)
-        i = i + 1
-    main_dataframe = df.ix[:, main_index[0]:main_index[-1]+1]
+    """
+    Select the main columns of a data frame using the 'Type' row of its source file.
+    Only the header of the source file is read.
+    :param infile: File path or file-like object the data frame was read from.
+    :param df: The pd.DataFrame.
+    :returns: The main columns.
+    """
+    annotations, _ = read_header(infile)
+    main_index = [i for i, c_type in enumerate(annotations['Type']) if c_type == 'E']
+    main_dataframe = df.iloc[:, main_index[0]:main_index[-1]+1]
     return main_dataframe
+
+# Monkey-patching pandas
+pd.DataFrame.to_perseus = to_perseus
+pd.read_perseus = read_perseus
+pd.read_perseus_many = read_perseus_many
@@ -0,0 +1,98 @@
+"""
+Memory-mapped access to the main 'E' columns of Perseus matrices.
+
+The main columns are extracted once into a raw binary file next to the matrix.
+All processes mapping this file share one copy of the expression values
+through the page cache.
+
+>>> from perseuspy.io.perseus.memmap import read_main_memmap
+>>> values, rows, columns = read_main_memmap(path, dtype='float32')
+>>> df = pd.DataFrame(values, columns=columns) # no copy for a single dtype
+"""
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from perseuspy.io.perseus.matrix import read_perseus, read_header, create_column_index
+
+def read_main_memmap(path, dtype='float64', memmap_file=None, chunksize=100000):
+    """
+    Read the main columns of a Perseus matrix as a read-only np.memmap.
+    The binary file is (re-)created if it is missing or if the size or modification
+    time of the matrix changed, which are recorded in `identity_file`.
+
+    :param path: Path to the matrix.
+    :param dtype: Floating point type of the values, default='float64'.
+    :param memmap_file: Path to the binary file, default=None uses `default_memmap_file`.
+    :param chunksize: Number of rows converted at once during extraction, default=100000.
+    :returns: np.memmap of shape (rows, main columns), pd.DataFrame of all other
+        columns and the column index of the main columns.
+    """
+    dtype = np.dtype(dtype)
+    annotations, _ = read_header(path)
+    types = annotations.get('Type', [])
+    main = [i for i, x in enumerate(types) if x == 'E']
+    if len(main) == 0:
+        raise ValueError('The matrix {} has no main columns.'.format(path))
+    other = [i for i, x in enumerate(annotations['Column Name']) if i >= len(types) or types[i] != 'E']
+    memmap_file = default_memmap_file(path, dtype) if memmap_file is None else memmap_file
+    if not _is_up_to_date(memmap_file, path):
+        extract_main_columns(path, memmap_file, main, dtype, chunksize)
+    nrow = os.path.getsize(memmap_file) // (dtype.itemsize * len(main))
+    if nrow > 0:
+        values = np.memmap(memmap_file, dtype=dtype, mode='r', shape=(nrow, len(main)))
+    else: # empty files cannot be mapped
+        values = np.empty((0, len(main)), dtype=dtype)
+    rows = read_perseus(path, usecols=other) if len(other) > 0 else pd.DataFrame(index=pd.RangeIndex(nrow))
+    columns = create_column_index(annotations)[main]
+    return values, rows, columns
+
+def default_memmap_file(path, dtype):
+    """ The default binary file '{path}.main.{dtype}' next to the matrix. """
+    return '{}.main.{}'.format(path, np.dtype(dtype).name)
+
+def identity_file(memmap_file):
+    """ The file '{memmap_file}.identity' recording the size and modification time of the matrix. """
+    return '{}.identity'.format(memmap_file)
+
+def extract_main_columns(path, memmap_file, main, dtype, chunksize=100000):
+    """
+    Write the main columns in C-order into a raw binary file. The file is
+    written to a temporary file first, so concurrent readers never see partial data.
+    The size and modification time of the matrix are written to `identity_file` afterwards.
+    :param path: Path to the matrix.
+    :param memmap_file: Path to the binary file.
+    :param main: Positions of the main columns.
+    :param dtype: Floating point type of the values.
+    :param chunksize: Number of rows converted at once, default=100000.
+    """
+    identity = _matrix_identity(path) # before reading, so changes during the extraction are detected later
+    def write_values(f):
+        for chunk in read_perseus(path, usecols=main, chunksize=chunksize):
+            np.ascontiguousarray(chunk.values, dtype=dtype).tofile(f)
+    _write_atomic(memmap_file, write_values)
+    _write_atomic(identity_file(memmap_file), lambda f: f.write('{} {}'.format(*identity).encode('utf-8')))
+
+def _write_atomic(file_path, write):
+    """ Write a binary file via a temporary file in the same directory. """
+    fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(file_path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_file, file_path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def _matrix_identity(path):
+    """ Size and modification time in nanoseconds of the matrix, see `cache.file_identity`. """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _is_up_to_date(memmap_file, path):
+    try:
+        with open(identity_file(memmap_file), 'rb') as f:
+            identity = tuple(int(x) for x in f.read().split())
+    except (OSError, ValueError):
+        return False
+    return os.path.isfile(memmap_file) and identity == _matrix_identity(path)
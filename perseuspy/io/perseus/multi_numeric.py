@@ -0,0 +1,195 @@
+"""
+Ragged array representation of Perseus multi-numeric 'M' columns.
+
+All numbers of a column are stored in a single contiguous float array,
+the numbers of row `i` are `values[offsets[i]:offsets[i+1]]`.
+
+>>> df = pd.read_perseus(path_or_file, multi_numeric='ragged')
+>>> array = df['MultiNum'].array
+>>> array.values, array.offsets, array.lengths()
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray, ExtensionDtype, register_extension_dtype
+
+@register_extension_dtype
+class MultiNumericDtype(ExtensionDtype):
+    """Dtype of multi-numeric columns stored as `MultiNumericArray`."""
+    name = 'multi_numeric'
+    type = np.ndarray
+    kind = 'O'
+    na_value = np.nan
+
+    @classmethod
+    def construct_array_type(cls):
+        return MultiNumericArray
+
+    def __from_arrow__(self, array):
+        """ Zero-copy conversion from a pyarrow (large) list array of floats. """
+        import pyarrow as pa
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks() if array.num_chunks != 1 else array.chunk(0)
+        offsets = np.asarray(array.offsets)
+        values = array.values.to_numpy(zero_copy_only=False)
+        return MultiNumericArray(values, offsets)
+
+class MultiNumericArray(ExtensionArray):
+    """
+    Ragged array of floats. Each element is a (possibly empty) np.ndarray view into `values`.
+    :param values: All numbers of the column.
+    :param offsets: Start of each row in `values` followed by the total number of values.
+    """
+    def __init__(self, values, offsets):
+        self.values = np.asarray(values, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_strings(cls, strings, separator=';'):
+        """
+        Parse all strings of a column at once. Empty numbers are skipped.
+        :param strings: Sequence of strings, missing values are treated as empty strings.
+        :param separator: Separator between numbers, default=';'.
+        """
+        strings = ['' if isinstance(s, float) else s for s in strings] # NaN
+        n = len(strings)
+        if n == 0:
+            return cls(np.array([], dtype=float), np.zeros(1, dtype=np.int64))
+        counts = np.fromiter((s.count(separator) + 1 for s in strings), dtype=np.int64, count=n)
+        tokens = np.array(separator.join(strings).split(separator))
+        valid = tokens != ''
+        row_ids = np.repeat(np.arange(n), counts)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_ids[valid], minlength=n), out=offsets[1:])
+        return cls(tokens[valid].astype(float), offsets)
+
+    @classmethod
+    def from_lists(cls, lists):
+        """
+        Create array from a sequence of lists of numbers.
+        :param lists: Sequence of lists or arrays.
+        """
+        lengths = np.fromiter((len(x) for x in lists), dtype=np.int64, count=len(lists))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        values = np.concatenate([np.asarray(x, dtype=float) for x in lists]) if len(lists) > 0 else []
+        return cls(values, offsets)
+
+    def to_strings(self, separator=';'):
+        """
+        Format all rows as strings of numbers joined by the separator.
+        :param separator: Separator between numbers, default=';'.
+        :returns: np.ndarray of strings.
+        """
+        tokens = self.values.astype(str).tolist()
+        offsets = self.offsets.tolist()
+        return np.array([separator.join(tokens[start:end]) for start, end in zip(offsets[:-1], offsets[1:])], dtype=object)
+
+    def lengths(self):
+        """ Number of values in each row. """
+        return np.diff(self.offsets)
+
+    def row_ids(self):
+        """ Row position of each value. """
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    def row_sums(self):
+        """ Sum of the values in each row, 0 for empty rows. """
+        return np.bincount(self.row_ids(), weights=self._row_values(), minlength=len(self))
+
+    def row_means(self):
+        """ Mean of the values in each row, NaN for empty rows. """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.row_sums() / self.lengths()
+
+    def _row_values(self):
+        """ Values referenced by the rows. Sliced arrays share `values` with their parent. """
+        return self.values[self.offsets[0]:self.offsets[-1]]
+
+    def __arrow_array__(self, type=None):
+        """ Conversion to a pyarrow large list array of floats. """
+        import pyarrow as pa
+        return pa.LargeListArray.from_arrays(pa.array(self.offsets - self.offsets[0]), pa.array(self._row_values()))
+
+    @property
+    def dtype(self):
+        return MultiNumericDtype()
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.offsets.nbytes
+
+    @classmethod
+    def _from_sequence(cls, scalars, dtype=None, copy=False):
+        if isinstance(scalars, cls):
+            return scalars.copy() if copy else scalars
+        return cls.from_lists([[] if _is_missing(x) else x for x in scalars])
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls.from_lists(values)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        values = np.concatenate([x._row_values() for x in to_concat] or [[]])
+        lengths = np.concatenate([x.lengths() for x in to_concat] or [[]]).astype(np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(values, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            item = int(item)
+            if item < 0:
+                item = item + len(self)
+            return self.values[self.offsets[item]:self.offsets[item + 1]]
+        if isinstance(item, slice) and item.step in (None, 1):
+            start, stop, _ = item.indices(len(self))
+            stop = max(start, stop)
+            return type(self)(self.values, self.offsets[start:stop + 1])
+        item = pd.api.indexers.check_array_indexer(self, item)
+        if item.dtype == bool:
+            item = np.flatnonzero(item)
+        return self.take(item)
+
+    def __eq__(self, other):
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        other = other if isinstance(other, MultiNumericArray) else MultiNumericArray._from_sequence(other)
+        return np.array([len(a) == len(b) and np.array_equal(a, b) for a, b in zip(self, other)], dtype=bool)
+
+    def __array__(self, dtype=None):
+        result = np.empty(len(self), dtype=object)
+        for i, row in enumerate(self):
+            result[i] = row
+        return result
+
+    def isna(self):
+        return np.zeros(len(self), dtype=bool)
+
+    def take(self, indices, allow_fill=False, fill_value=None):
+        indices = np.asarray(indices, dtype=np.int64)
+        if allow_fill:
+            if np.any(indices < -1):
+                raise ValueError('Invalid value in indices, must be all >= -1 for allow_fill=True.')
+            missing = indices == -1
+        else:
+            indices = np.where(indices < 0, indices + len(self), indices)
+            missing = np.zeros(len(indices), dtype=bool)
+        if np.any(indices >= len(self)):
+            raise IndexError('Index out of bounds for MultiNumericArray of length {}.'.format(len(self)))
+        starts = self.offsets[:-1][indices]
+        lengths = np.where(missing, 0, self.lengths()[indices])
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # position of each taken value in self.values
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return type(self)(self.values[positions], offsets)
+
+    def copy(self):
+        return type(self)(self._row_values().copy(), self.offsets - self.offsets[0])
+
+def _is_missing(x):
+    return x is None or (isinstance(x, float) and np.isnan(x))
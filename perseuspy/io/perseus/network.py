@@ -1,31 +1,166 @@
+import os
 from os import path, makedirs
 import uuid
 import networkx as nx
 from collections import OrderedDict
-from perseuspy.io.perseus.matrix import read_perseus
+from collections.abc import MutableMapping
+from perseuspy.io.perseus.matrix import read_perseus, compression_extensions
 import pandas as pd
 import warnings
+from perseuspy.instrumentation import instrumented
 
-def read_networks(folder):
+@instrumented('read_networks')
+def read_networks(folder, select=None, lazy=True, cache_size=None, workers=None, pool='thread'):
     """
     Read perseus network collection folder format
     
     >>> network_table, networks = read_networks(folder)
     
+    Compressed tables, e.g. 'networks.txt.gz', are read transparently.
+
+    By default the node and edge tables are only read on first access, so time
+    and memory are proportional to the networks actually used.
+
+    >>> network_table, networks = read_networks(folder, select=lambda row: row['Nodes'] > 100)
+
+    With `workers` all node and edge tables are read up front, concurrently in
+    a thread or process pool. Threads suit latency-bound storage, e.g. network
+    file systems, processes suit large tables on local disks.
+
+    >>> network_table, networks = read_networks(folder, workers=16)
+
     :param folder: Path to network collection
+    :param select: Collection of GUIDs or predicate on the rows of the network table
+        selecting the networks to read, default=None reads all.
+    :param lazy: Read node and edge tables on first access, default=True.
+    :param cache_size: Maximal number of node and edge tables kept in memory when lazy,
+        least recently used tables are evicted. default=None keeps all, 0 re-reads on each access.
+    :param workers: Number of concurrent workers reading the tables, default=None.
+        Implies `lazy=False`.
+    :param pool: Either 'thread' or 'process', default='thread'.
     :returns: Network table and dictionary with 'name', 'edge_table', and 'node_table' keys.
     """
-    network_table = read_perseus(path.join(folder, "networks.txt"))
+    network_table = read_perseus(_find_table(folder, "networks.txt"))
+    if select is not None:
+        if callable(select):
+            mask = [bool(select(row)) for _, row in network_table.iterrows()]
+        else:
+            mask = network_table['GUID'].isin(set(select)).values
+        network_table = network_table[mask].reset_index(drop=True)
+    if lazy and workers is None:
+        return network_table, NetworkCollection(folder, network_table, cache_size)
+    names = network_table[['Name', 'GUID']].values
+    files = [_find_table(folder, "{}_{}.txt".format(guid, kind)) for _, guid in names for kind in ('nodes', 'edges')]
+    tables = iter(_map(read_perseus, [(f,) for f in files], workers, pool))
     networks = {}
-    for name, guid in network_table[['Name', 'GUID']].values:
+    for name, guid in names:
         networks[guid] = {
                 'name': name,
                 'guid': guid,
-                'node_table': read_perseus(path.join(folder, "{}_nodes.txt".format(guid))),
-                'edge_table': read_perseus(path.join(folder, "{}_edges.txt".format(guid)))
+                'node_table': next(tables),
+                'edge_table': next(tables)
                 }
     return network_table, networks
 
+class NetworkCollection(MutableMapping):
+    """Dictionary of network GUID -> network which reads the node and edge tables
+    of each network on first access, see `read_networks`.
+    :param folder: Path to network collection
+    :param network_table: Network table of the networks in the collection.
+    :param cache_size: Maximal number of node and edge tables kept in memory,
+        default=None keeps all, 0 re-reads on each access."""
+    def __init__(self, folder, network_table, cache_size=None):
+        self.folder = folder
+        self.cache_size = cache_size
+        self.networks = OrderedDict((guid, LazyNetwork(self, guid, name))
+                for name, guid in network_table[['Name', 'GUID']].values)
+        self._tables = OrderedDict()
+
+    def read_table(self, guid, kind):
+        """ Node or edge table of a network.
+        :param guid: GUID of the network.
+        :param kind: Either 'nodes' or 'edges'."""
+        key = (guid, kind)
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key]
+        table = read_perseus(_find_table(self.folder, "{}_{}.txt".format(guid, kind)))
+        if self.cache_size != 0:
+            self._tables[key] = table
+            while self.cache_size is not None and len(self._tables) > self.cache_size:
+                self._tables.popitem(last=False)
+        return table
+
+    def __getitem__(self, guid):
+        return self.networks[guid]
+
+    def __setitem__(self, guid, network):
+        self.networks[guid] = network
+
+    def __delitem__(self, guid):
+        del self.networks[guid]
+
+    def __iter__(self):
+        return iter(self.networks)
+
+    def __len__(self):
+        return len(self.networks)
+
+class LazyNetwork(MutableMapping):
+    """Network dictionary with 'name', 'guid', 'node_table' and 'edge_table' keys.
+    The tables are read from the collection on access unless they were set explicitly."""
+    _tables = {'node_table': 'nodes', 'edge_table': 'edges'}
+
+    def __init__(self, collection, guid, name):
+        self.collection = collection
+        self.data = {'name': name, 'guid': guid}
+
+    def __getitem__(self, key):
+        if key in self.data:
+            return self.data[key]
+        if key in self._tables:
+            return self.collection.read_table(self.data['guid'], self._tables[key])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __iter__(self):
+        return iter(list(self.data) + [key for key in self._tables if key not in self.data])
+
+    def __len__(self):
+        return len(set(self.data) | set(self._tables))
+
+def _map(function, arguments, workers=None, pool='thread'):
+    """
+    Call the function on each tuple of arguments, in order.
+    :param workers: Number of concurrent calls, default=None calls serially.
+    :param pool: Either 'thread' or 'process', default='thread'.
+    :returns: List of results.
+    """
+    if workers is None or workers <= 1 or len(arguments) <= 1:
+        return [function(*args) for args in arguments]
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    executors = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+    if pool not in executors:
+        raise ValueError("Unknown pool {}, use 'thread' or 'process'.".format(pool))
+    with executors[pool](max_workers=workers) as executor:
+        return list(executor.map(function, *zip(*arguments)))
+
+def _find_table(folder, name):
+    """ Path to the uncompressed or, if missing, to the compressed table. """
+    table = path.join(folder, name)
+    if path.isfile(table):
+        return table
+    for extension in compression_extensions.values():
+        if path.isfile(table + extension):
+            return table + extension
+    return table
+
+@instrumented('from_perseus', rows=len)
 def from_perseus(network_table, networks):
     """
     Create networkx graph from network tables
@@ -38,23 +173,27 @@ def from_perseus(network_table, networks):
     for guid, graph_attr in zip(network_table['GUID'], network_table.values):
         network = networks[guid]
         edge_table = network['edge_table']
-        if edge_table[['Source', 'Target']].duplicated().any():
+        edge_attr = [column for column in edge_table.columns if column not in ('Source', 'Target')]
+        G = nx.from_pandas_edgelist(edge_table, 'Source', 'Target', edge_attr or None, create_using=nx.DiGraph())
+        if G.number_of_edges() < len(edge_table):
             warnings.warn('Duplicate edges were found and ignored in network {}'.format(network['name']))
-        G = nx.from_pandas_edgelist(edge_table, 'Source', 'Target', True, create_using=nx.DiGraph())
-        for attr, value in zip(network_table.columns, graph_attr):
-            G.graph[attr] = value
+        G.graph.update(zip(network_table.columns, graph_attr))
         node_table = network['node_table']
-        if node_table['Node'].duplicated().any():
+        nodes = _node_attributes(node_table)
+        if len(nodes) < len(node_table):
             warnings.warn('Duplicate nodes were found and ignored in network {}'.format(network['name']))
-        node_column = node_table['Node']
-        for name, attributes in zip(node_column, node_table.values):
-            if name not in G:
-                G.add_node(name)
-            for attr, value in zip(node_table.columns, attributes):
-                G.node[name][attr] = value
+        G.add_nodes_from(nodes.items())
         graphs.append(G)
     return graphs
 
+def _node_attributes(node_table):
+    """ Dictionary of node -> attribute dictionary, later rows override duplicate nodes.
+    Columns are converted to lists at once instead of accessing each cell. """
+    columns = list(node_table.columns)
+    rows = zip(*(node_table[column].tolist() for column in columns))
+    return dict(zip(node_table['Node'].tolist(), (dict(zip(columns, row)) for row in rows)))
+
+@instrumented('to_perseus_networks', rows=lambda result: len(result[1]))
 def to_perseus(graphs):
     """
     Create a network table and the network dictionary for export to Perseus.
@@ -90,16 +229,38 @@ def to_perseus(graphs):
     network_table.columns.name = "Column Name"
     return network_table, networks
     
-def write_networks(folder, network_table, networks):
+@instrumented('write_networks')
+def write_networks(folder, network_table, networks, compression=None, workers=None, pool='thread'):
     """
     Writing networkTable, nodes and edges to Perseus readable format.
+
+    Each table is written to a temporary file which is renamed on completion,
+    and the network table is written last. Perseus therefore never sees a
+    partially written table or a network without its node and edge tables.
     
     :param folder: Path to output directory.
     :param network_table: Network table.
     :param networks: Dictionary with node and edge tables, indexed by network guid.
+    :param compression: Compress all tables with 'gzip', 'bz2', 'xz' or 'zstd', default=None.
+    :param workers: Number of concurrent workers writing the node and edge tables, default=None.
+    :param pool: Either 'thread' or 'process', default='thread'.
     """
+    extension = '' if compression is None else compression_extensions[compression]
     makedirs(folder, exist_ok=True) 
-    network_table.to_perseus(path.join(folder, 'networks.txt'), main_columns=[])
+    arguments = []
     for guid, network in networks.items():
-        network['node_table'].to_perseus(path.join(folder, '{}_nodes.txt'.format(guid)), main_columns=[])
-        network['edge_table'].to_perseus(path.join(folder, '{}_edges.txt'.format(guid)), main_columns=[])
+        arguments.append((network['node_table'], path.join(folder, '{}_nodes.txt{}'.format(guid, extension))))
+        arguments.append((network['edge_table'], path.join(folder, '{}_edges.txt{}'.format(guid, extension))))
+    _map(_write_table, arguments, workers, pool)
+    _write_table(network_table, path.join(folder, 'networks.txt' + extension))
+
+def _write_table(table, file_path):
+    """ Write a table atomically via a temporary file in the same folder. """
+    folder, name = path.split(file_path)
+    tmp_file = path.join(folder, '.{}-{}'.format(uuid.uuid4().hex, name)) # keeps the compression extension
+    try:
+        table.to_perseus(tmp_file, main_columns=[])
+        os.replace(tmp_file, file_path)
+    finally:
+        if path.exists(tmp_file):
+            os.remove(tmp_file)
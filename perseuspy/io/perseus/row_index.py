@@ -0,0 +1,157 @@
+"""
+Random access to the rows of large Perseus matrices.
+
+The byte offsets of all data rows are recorded once in a compressed sidecar
+file next to the matrix, optionally together with the values of an identifier
+column. Selected rows are then read by seeking directly to their lines.
+
+>>> from perseuspy.io.perseus.row_index import read_perseus_rows
+>>> df = read_perseus_rows(path, keys=['P12345', 'Q67890'], key_column='Protein IDs')
+>>> df = read_perseus_rows(path, rows=[0, 1000, 2000000])
+
+Compressed matrices are not supported, since their byte offsets are not seekable.
+"""
+import io
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from perseuspy.io.perseus.matrix import read_perseus, read_header, separator, _detect_compression
+
+def read_perseus_rows(path, rows=None, keys=None, key_column=None, index_file=None, **kwargs):
+    """
+    Read selected rows of a Perseus-formatted matrix, see `read_perseus`.
+    Only the selected lines are parsed. The row index is (re-)built if it is missing,
+    the size or modification time of the matrix changed or it is keyed by a different column.
+    Note that categories of 'C' columns are inferred from the selected rows only.
+
+    :param path: Path to the matrix.
+    :param rows: Row positions in the order they are returned, duplicates are allowed.
+    :param keys: Values of the identifier column. All matching rows are returned in file order,
+        missing keys are ignored. Keys are compared as strings.
+    :param key_column: Name or position of the identifier column, required for `keys`.
+    :param index_file: Path to the sidecar file, default=None uses `default_index_file`.
+    :param kwargs: Keyword arguments passed as-is to `read_perseus`.
+    :returns: The parsed data frame, indexed by row position.
+    """
+    if (rows is None) == (keys is None):
+        raise ValueError('Specify either rows or keys.')
+    if keys is not None and key_column is None:
+        raise ValueError('Selecting rows by keys requires a key_column.')
+    offsets, index_keys = read_row_index(path, key_column if keys is not None else None, index_file)
+    nrow = len(offsets) - 1
+    if keys is not None:
+        positions = np.flatnonzero(np.isin(index_keys, np.array([str(key) for key in keys])))
+    else:
+        positions = np.asarray(rows, dtype=np.int64).reshape(-1)
+        positions = np.where(positions < 0, positions + nrow, positions)
+        if np.any((positions < 0) | (positions >= nrow)):
+            raise IndexError('Row positions out of bounds for matrix with {} rows.'.format(nrow))
+    unique, inverse = np.unique(positions, return_inverse=True)
+    with open(path, 'rb') as f:
+        data = [f.read(offsets[0])]
+        for run in np.split(unique, np.flatnonzero(np.diff(unique) != 1) + 1):
+            if len(run) == 0:
+                continue
+            f.seek(offsets[run[0]])
+            lines = f.read(offsets[run[-1] + 1] - offsets[run[0]])
+            data.append(lines if lines.endswith(b'\n') else lines + b'\n')
+    df = read_perseus(io.BytesIO(b''.join(data)), **kwargs)
+    df.index = pd.Index(unique)
+    return df if keys is not None else df.iloc[inverse.reshape(-1)]
+
+def read_row_index(path, key_column=None, index_file=None):
+    """
+    Load the row index of a matrix, (re-)building it if necessary.
+    :param path: Path to the matrix.
+    :param key_column: Name or position of the identifier column, default=None.
+        An existing index is re-used regardless of its key column if None.
+    :param index_file: Path to the sidecar file, default=None uses `default_index_file`.
+    :returns: Byte offsets of the data rows followed by the end of the last row, and
+        the keys as np.ndarray of strings or None.
+    """
+    index_file = default_index_file(path) if index_file is None else index_file
+    if os.path.isfile(index_file):
+        with np.load(index_file) as index:
+            if 'matrix' in index and tuple(index['matrix']) == _matrix_identity(path) and (key_column is None
+                    or ('key_column' in index and str(index['key_column']) == str(key_column))):
+                return index['offsets'], index['keys'] if 'keys' in index else None
+    return build_row_index(path, key_column, index_file)
+
+def _matrix_identity(path):
+    """ Size and modification time in nanoseconds of the matrix, see `cache.file_identity`. """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def default_index_file(path):
+    """ The default sidecar file '{path}.rowindex.npz' next to the matrix. """
+    return '{}.rowindex.npz'.format(path)
+
+def build_row_index(path, key_column=None, index_file=None, blocksize=1 << 24):
+    """
+    Record the byte offsets of all data rows and write them to the sidecar file.
+    Empty lines are skipped like in `read_perseus`.
+    :param path: Path to the matrix.
+    :param key_column: Name or position of the identifier column, default=None.
+    :param index_file: Path to the sidecar file, default=None uses `default_index_file`.
+    :param blocksize: Number of bytes scanned at once, default=16MiB.
+    :returns: Byte offsets of the data rows followed by the end of the last row, and
+        the keys as np.ndarray of strings or None.
+    """
+    index_file = default_index_file(path) if index_file is None else index_file
+    matrix = _matrix_identity(path) # before reading, so changes during the build are detected later
+    with open(path, 'rb') as f:
+        if _detect_compression(f) is not None:
+            raise ValueError('Row indices are not supported for compressed matrix {}.'.format(path))
+    annotations, start = read_header(path)
+    with open(path, 'rb') as f:
+        offsets = _line_offsets(f, start, blocksize)
+    lengths = np.diff(offsets)
+    offsets = np.append(offsets[:-1][lengths > 1], offsets[-1]) # drop empty lines
+    index = {'offsets': offsets, 'matrix': np.array(matrix, dtype=np.int64)}
+    keys = None
+    if key_column is not None:
+        keys = _read_keys(path, annotations, key_column, start)
+        if len(keys) != len(offsets) - 1:
+            raise ValueError('Found {} keys for {} rows in {}.'.format(len(keys), len(offsets) - 1, path))
+        index.update(keys=keys, key_column=np.array(str(key_column)))
+    fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(index_file)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **index)
+        os.replace(tmp_file, index_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return offsets, keys
+
+def _line_offsets(f, start, blocksize):
+    """ Start of every line after `start` followed by the end of the file. """
+    f.seek(start)
+    offsets = [np.array([start], dtype=np.int64)]
+    position = start
+    block = f.read(blocksize)
+    while block:
+        newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+        offsets.append(newlines.astype(np.int64) + position + 1)
+        position += len(block)
+        block = f.read(blocksize)
+    offsets = np.concatenate(offsets)
+    if offsets[-1] != position: # last line without newline
+        offsets = np.append(offsets, position)
+    return offsets
+
+def _read_keys(path, annotations, key_column, start):
+    """ Raw text values of the key column. """
+    column_names = annotations['Column Name']
+    if isinstance(key_column, int):
+        position = key_column
+    elif key_column in column_names:
+        position = column_names.index(key_column)
+    else:
+        raise ValueError('Key column {} not found in {}.'.format(key_column, path))
+    with open(path, 'rb') as f:
+        f.seek(start)
+        keys = pd.read_csv(f, sep=separator, header=None, names=range(len(column_names)),
+                usecols=[position], dtype=str, keep_default_na=False)[position].values
+    return keys.astype(str)
@@ -2,8 +2,19 @@
 
 This module contains convenience function for parsing
 the Perseus parameters.xml file and extracting parameter values
+
+All parameters are indexed by name in a single pass over the tree:
+
+>>> parameters = Parameters(parse_parameters(filename))
+>>> parameters['Number of columns']
+15
+>>> value, subparameters = parameters['Choose']
+>>> subparameters['Sub']
+3.0
 """
+import weakref
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
 
 def parse_parameters(filename):
     """ parse the parameters.xml file.
@@ -12,14 +23,138 @@ def parse_parameters(filename):
     """
     return ET.parse(filename)
 
+_sub_parameter_tags = {'SubParams', 'SubParamsTrue', 'SubParamsFalse'}
+
+class Parameters():
+    """Name -> value index of the parameters of one scope, e.g. the top level or
+    the sub-parameters of a `SingleChoiceWithSubParams`. Values are decoded on
+    first access according to the parameter type. Parameters nested in
+    sub-parameter groups are only accessible from their `Parameters` object.
+    :param tree: 'xml.etree.ElementTree' or 'Parameters' element."""
+    def __init__(self, tree):
+        self.root = tree.getroot() if hasattr(tree, 'getroot') else tree
+        self.elements = OrderedDict()
+        self._values = {}
+        self._index(self.root)
+
+    @classmethod
+    def parse(cls, filename):
+        """ Parse the parameters.xml file.
+        :param filename: 'parameters.xml' path or file-like."""
+        return cls(parse_parameters(filename))
+
+    def _index(self, element):
+        """ Index all named parameters in document order, skipping sub-parameter groups. """
+        for child in element:
+            if child.tag in _sub_parameter_tags:
+                continue
+            name = child.get('Name')
+            if name is not None and child.tag != 'ParameterGroup':
+                self.elements.setdefault(name, child)
+            self._index(child)
+
+    def element(self, name, kind=None):
+        """ xml element of a parameter.
+        :param name: the name of the parameter.
+        :param kind: the expected xml-tag name of the parameter, e.g. 'IntParam', default=None accepts all.
+        :raises KeyError: if there is no such parameter in this scope."""
+        element = self.elements[name]
+        if kind is not None and element.tag != kind:
+            raise KeyError('Parameter {} is a {}, not a {}.'.format(name, element.tag, kind))
+        return element
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            element = self.elements[name]
+            self._values[name] = _decoders.get(element.tag, _decode_text)(element)
+        return self._values[name]
+
+    def get(self, name, default=None):
+        """ value of the parameter or the default if there is no such parameter. """
+        return self[name] if name in self.elements else default
+
+    def __contains__(self, name):
+        return name in self.elements
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def to_dict(self):
+        """ All parameter values. Sub-parameters are converted into nested dictionaries.
+        :returns: Ordered dictionary of name -> value."""
+        result = OrderedDict()
+        for name in self.elements:
+            value = self[name]
+            if isinstance(value, tuple) and isinstance(value[1], Parameters):
+                value = (value[0], value[1].to_dict())
+            result[name] = value
+        return result
+
+def _decode_text(element):
+    return element.find('Value').text
+
+def _decode_bool(element, kind='BoolParam'):
+    value = element.find('Value').text
+    if value not in {'true', 'false'}:
+        raise ValueError('{} Value has to be either "true" or "false", was {}.'.format(kind, value))
+    return value == 'true'
+
+def _decode_single_choice(element):
+    value = int(element.find('Value').text)
+    if value < 0:
+        return value
+    return element.find('Values')[value].text
+
+def _decode_multi_choice(element):
+    values = element.find('Values')
+    return [values[int(item.text)].text for item in element.find('Value').findall('Item')]
+
+def _decode_single_choice_with_sub_params(element):
+    value = int(element.find('Value').text)
+    if value < 0:
+        return value, None
+    return element.find('Values')[value].text, Parameters(element.findall('SubParams/Parameters')[value])
+
+def _decode_bool_with_sub_params(element):
+    value = _decode_bool(element, 'BoolParamWithSubParams')
+    choice = 'SubParamsTrue' if value else 'SubParamsFalse'
+    return value, Parameters(element.find('{}/Parameters'.format(choice)))
+
+_decoders = {
+        'IntParam': lambda element: int(_decode_text(element)),
+        'DoubleParam': lambda element: float(_decode_text(element)),
+        'BoolParam': _decode_bool,
+        'SingleChoiceParam': _decode_single_choice,
+        'MultiChoiceParam': _decode_multi_choice,
+        'SingleChoiceWithSubParams': _decode_single_choice_with_sub_params,
+        'BoolWithSubParams': _decode_bool_with_sub_params}
+
+_indices = weakref.WeakKeyDictionary()
+def _element(parameters, kind, name):
+    """ xml element of a parameter using the cached index of the tree.
+    Falls back to searching all descendants for parameters nested in sub-parameter groups.
+    :param parameters: the parameters tree, element or 'Parameters' object.
+    :param kind: the xml-tag name of the parameter.
+    :param name: the name of the parameter."""
+    if not isinstance(parameters, Parameters):
+        if parameters not in _indices:
+            _indices[parameters] = Parameters(parameters)
+        parameters = _indices[parameters]
+    try:
+        return parameters.element(name, kind)
+    except KeyError:
+        return parameters.root.find(".//{kind}[@Name='{name}']".format(kind=kind, name=name))
+
 def _simple_string_value(tree, kind, name):
     """ base function for extracting a simple parameter value.
     :param tree: the parameters tree.
     :param kind: the xml-tag name of the parameter.
     :param name: the name of the parameter.
     :returns value: the content of the parameter 'Value' as string."""
-    query = ".//{kind}[@Name='{name}']/Value".format(kind=kind, name=name)
-    return tree.find(query).text
+    return _element(tree, kind, name).find('Value').text
 
 def stringParam(parameters, name):
     """ string parameter value.
@@ -43,10 +178,7 @@ def boolParam(parameters, name):
     """ boolean parameter value.
     :param parameters: the parameters tree.
     :param name: the name of the parameter.  """
-    value = _simple_string_value(parameters, 'BoolParam', name)
-    if value not in {'true', 'false'}:
-        raise ValueError('BoolParam Value has to be either "true" or "false", was {}.'.format(value))
-    return value == 'true'
+    return _decode_bool(_element(parameters, 'BoolParam', name))
 
 def doubleParam(parameters, name):
     """ double parameter value.
@@ -59,12 +191,10 @@ def singleChoiceParam(parameters, name, type_converter = str):
     :param parameters: the parameters tree.
     :param name: the name of the parameter.
     :param type_converter: function to convert the chosen value to a different type (e.g. str, float, int). default = 'str'"""
-    param = parameters.find(".//SingleChoiceParam[@Name='{name}']".format(name=name))
-    value = int(param.find('Value').text)
-    values = param.find('Values')
-    if value < 0:
+    value = _decode_single_choice(_element(parameters, 'SingleChoiceParam', name))
+    if isinstance(value, int): # no value chosen
         return value
-    return type_converter(values[value].text)
+    return type_converter(value)
 
 def multiChoiceParam(parameters, name, type_converter = str):
     """ multi choice parameter values.
@@ -73,17 +203,14 @@ def multiChoiceParam(parameters, name, type_converter = str):
     :param type_converter: function to convert the chosen value to a different type (e.g. str, float, int). default = 'str'
     :returns dictionary: value -> values
     """
-    param = parameters.find(".//MultiChoiceParam[@Name='{name}']".format(name=name))
-    value = param.find('Value')
-    values = param.find('Values')
-    return [type_converter(values[int(item.text)].text) for item in value.findall('Item')]
+    return [type_converter(value) for value in _decode_multi_choice(_element(parameters, 'MultiChoiceParam', name))]
 
 def singleChoiceWithSubParams(parameters, name, type_converter = str):
     """ single choice with sub parameters value and chosen subparameters. Returns -1 and None if no value was chosen.
     :param parameters: the parameters tree.
     :param name: the name of the parameter.
     :param type_converter: function to convert the chosen value to a different type (e.g. str, float, int). default = 'str'"""
-    param = parameters.find(".//SingleChoiceWithSubParams[@Name='{name}']".format(name=name))
+    param = _element(parameters, 'SingleChoiceWithSubParams', name)
     value = int(param.find('Value').text)
     values = param.find('Values')
     if value < 0:
@@ -95,11 +222,7 @@ def boolWithSubParams(parameters, name):
     :param parameters: the parameters tree.
     :param name: the name of the parameter.
     """
-    param = parameters.find(".//BoolWithSubParams[@Name='{name}']".format(name=name))
-    str_value = param.find('Value').text
-    if str_value not in {'true', 'false'}:
-        raise ValueError('BoolParamWithSubParams Value has to be either "true" or "false", was {}'.format(str_value))
-    value = str_value == 'true'
+    param = _element(parameters, 'BoolWithSubParams', name)
+    value = _decode_bool(param, 'BoolParamWithSubParams')
     choice = 'SubParamsTrue' if value else 'SubParamsFalse'
     return value, param.find('{}/Parameters'.format(choice))
-
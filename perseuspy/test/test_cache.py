@@ -0,0 +1,68 @@
+from unittest import TestCase, main, skipUnless
+from os import path, listdir, utime
+from shutil import rmtree, copyfile
+import tempfile
+from perseuspy import pd
+from perseuspy.io.perseus.cache import read_perseus_cached, evict
+
+TEST_DIR = path.dirname(__file__)
+
+try:
+    import pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+@skipUnless(HAS_PYARROW, 'requires pyarrow')
+class TestCache(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = path.join(self.tmp_dir, 'cache')
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_cached_matrix_equals_parsed_matrix(self):
+        for name in ['matrix.txt', 'matrix4.txt', 'matrix5.txt']:
+            infile = path.join(TEST_DIR, name)
+            df = pd.read_perseus(infile)
+            read_perseus_cached(infile, cache_dir=self.cache_dir)
+            cached = read_perseus_cached(infile, cache_dir=self.cache_dir)
+            self.assertTrue(df.equals(cached), name)
+            self.assertTrue(df.columns.equals(cached.columns), name)
+            self.assertEqual(list(df.dtypes), list(cached.dtypes), name)
+
+    def test_missing_text_values_are_nan(self):
+        infile = path.join(self.tmp_dir, 'missing.txt')
+        with open(infile, 'w') as f:
+            f.write('a\tb\n#!{Type}T\tN\nx\t1\n\t2\ny\t\n')
+        df = pd.read_perseus(infile)
+        read_perseus_cached(infile, cache_dir=self.cache_dir)
+        cached = read_perseus_cached(infile, cache_dir=self.cache_dir)
+        pd.testing.assert_frame_equal(df, cached)
+        self.assertEqual([False, True, False], list(cached['a'].isna()))
+        self.assertTrue(isinstance(cached['a'][1], float) and cached['a'][1] != cached['a'][1])
+
+    def test_cache_is_keyed_by_file_and_arguments(self):
+        infile = path.join(self.tmp_dir, 'matrix.txt')
+        copyfile(path.join(TEST_DIR, 'matrix.txt'), infile)
+        read_perseus_cached(infile, cache_dir=self.cache_dir)
+        read_perseus_cached(infile, cache_dir=self.cache_dir)
+        self.assertEqual(1, len(listdir(self.cache_dir)))
+        read_perseus_cached(infile, cache_dir=self.cache_dir, usecols=['Name'])
+        self.assertEqual(2, len(listdir(self.cache_dir)))
+        utime(infile, (0, 0))
+        read_perseus_cached(infile, cache_dir=self.cache_dir)
+        self.assertEqual(3, len(listdir(self.cache_dir)))
+
+    def test_evicting_to_size_budget(self):
+        for name in ['matrix.txt', 'matrix3.txt', 'matrix5.txt']:
+            read_perseus_cached(path.join(TEST_DIR, name), cache_dir=self.cache_dir, max_size=1)
+        self.assertEqual(0, len(listdir(self.cache_dir)))
+        for name in ['matrix.txt', 'matrix3.txt']:
+            read_perseus_cached(path.join(TEST_DIR, name), cache_dir=self.cache_dir)
+        evict(self.cache_dir, 10**9)
+        self.assertEqual(2, len(listdir(self.cache_dir)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+from unittest import TestCase, main
+from os import path
+import subprocess
+import sys
+
+ROOT_DIR = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+
+def run(code):
+    """ run code in a fresh interpreter and return its output. """
+    return subprocess.check_output([sys.executable, '-c', code], cwd=ROOT_DIR).decode('utf-8').strip()
+
+class TestLazyImports(TestCase):
+    def test_matrix_io_does_not_import_networkx(self):
+        output = run("import sys; from perseuspy import pd; print(hasattr(pd, 'read_perseus'), 'networkx' in sys.modules)")
+        self.assertEqual('True False', output)
+
+    def test_package_import_does_not_import_pandas(self):
+        output = run("import sys; import perseuspy; print('pandas' in sys.modules)")
+        self.assertEqual('False', output)
+        output = run("import pandas as pd; import perseuspy; print(hasattr(pd.DataFrame, 'to_perseus'))")
+        self.assertEqual('True', output)
+        output = run("import perseuspy; import pandas as pd; print(hasattr(pd, 'read_perseus'), hasattr(pd.DataFrame, 'to_perseus'))")
+        self.assertEqual('True True', output)
+
+    def test_networkx_is_patched_on_first_use(self):
+        output = run("from perseuspy import nx, read_networks; print(hasattr(nx, 'from_perseus'), callable(read_networks))")
+        self.assertEqual('True True', output)
+        output = run("import networkx as nx; import perseuspy; print(hasattr(nx, 'to_perseus'))")
+        self.assertEqual('True', output)
+        output = run("import perseuspy; import networkx as nx; print(hasattr(nx, 'from_perseus'))")
+        self.assertEqual('True', output)
+
+    def test_submodules_are_available_as_attributes(self):
+        output = run("import perseuspy; print(callable(perseuspy.io.perseus.matrix.read_perseus))")
+        self.assertEqual('True', output)
+
+if __name__ == '__main__':
+    main()
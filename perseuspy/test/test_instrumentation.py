@@ -0,0 +1,39 @@
+import sys
+from unittest import TestCase, main
+from os import path
+from io import StringIO
+import json
+from perseuspy import pd
+from perseuspy.instrumentation import instrument, stage, enabled
+
+TEST_DIR = path.dirname(__file__)
+
+class TestInstrumentation(TestCase):
+    def test_disabled_by_default(self):
+        self.assertFalse(enabled())
+        with stage('nothing') as record:
+            record['rows'] = 1
+
+    def test_recording_read_and_write_stages(self):
+        infile = path.join(TEST_DIR, 'matrix.txt')
+        with instrument(tracemalloc=True) as profile:
+            df = pd.read_perseus(infile)
+            df.to_perseus(StringIO())
+        self.assertFalse(enabled())
+        stages = [record['stage'] for record in profile.records]
+        self.assertIn('read_perseus/parse', stages)
+        self.assertIn('read_perseus/header/create_column_index', stages)
+        self.assertEqual('to_perseus', stages[-1])
+        read = [record for record in profile.records if record['stage'] == 'read_perseus'][0]
+        self.assertEqual(len(df), read['rows'])
+        self.assertEqual(path.getsize(infile), read['bytes'])
+        if sys.version_info >= (3, 9):
+            self.assertGreater(read['peak_tracemalloc'], 0)
+        self.assertIn('process_peak_rss', read)
+        self.assertGreaterEqual(read['wall_time'], 0)
+        records = json.loads(profile.to_json())
+        self.assertEqual(len(profile.records), len(records))
+        self.assertEqual(1, profile.summary()['to_perseus']['calls'])
+
+if __name__ == '__main__':
+    main()
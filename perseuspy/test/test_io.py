@@ -1,7 +1,10 @@
 from unittest import TestCase, main
+import os
 from os import path
-from io import StringIO
+from io import StringIO, BytesIO
 from perseuspy import pd
+from perseuspy.io.perseus.matrix import read_header, main_df, PerseusWriter
+from perseuspy.io.perseus.multi_numeric import MultiNumericArray
 import numpy as np
 
 TEST_DIR = path.dirname(__file__)
@@ -73,5 +76,269 @@ class TestReading(TestCase):
         df_str = to_string(df, convert_bool_to_category=False)
         self.assertEqual('Significant\n#!{Type}C\nTrue\nFalse\nTrue\nTrue\n', df_str, df_str)
 
+    def test_read_header_stops_at_first_data_row(self):
+        annotations, offset = read_header(path.join(TEST_DIR, 'matrix5.txt'))
+        self.assertEqual(['Column Name', 'dtype', 'converters', 'Type', 'N:Quantity1'], list(annotations.keys()))
+        self.assertEqual('E', annotations['Type'][0])
+        with open(path.join(TEST_DIR, 'matrix5.txt'), 'rb') as f:
+            f.seek(offset)
+            self.assertTrue(f.readline().startswith(b'NaN\tNaN\tNaN\tCK1'))
+
+    def test_read_header_resets_file_like(self):
+        f = StringIO('a\tb\n#!{Type}E\tT\n1\tx\n')
+        annotations, offset = read_header(f)
+        self.assertEqual(['E', 'T'], annotations['Type'])
+        self.assertEqual(0, f.tell())
+        f.seek(offset)
+        self.assertEqual('1\tx\n', f.readline())
+
+    def test_main_df(self):
+        infile = path.join(TEST_DIR, 'matrix3.txt')
+        df = pd.read_perseus(infile)
+        self.assertEqual(3, main_df(infile, df).shape[1])
+
+    def test_reading_from_unseekable_stream(self):
+        infile = path.join(TEST_DIR, 'matrix5.txt')
+        with open(infile, 'rb') as f:
+            content = f.read()
+        r, w = os.pipe()
+        os.write(w, content)
+        os.close(w)
+        with os.fdopen(r, 'rb') as pipe:
+            df = pd.read_perseus(pipe)
+        self.assertTrue(pd.read_perseus(infile).equals(df))
+
+    def test_reading_in_chunks(self):
+        infile = path.join(TEST_DIR, 'matrix.txt')
+        df = pd.read_perseus(infile)
+        chunks = list(pd.read_perseus(infile, chunksize=30))
+        self.assertEqual([30, 30, 30, 10], [len(chunk) for chunk in chunks])
+        for chunk in chunks:
+            self.assertTrue(df.columns.equals(chunk.columns))
+            self.assertEqual(list(df.dtypes), list(chunk.dtypes))
+        self.assertTrue(df.equals(pd.concat(chunks)))
+
+    def test_reading_multi_numeric_columns_in_chunks(self):
+        chunks = list(pd.read_perseus(path.join(TEST_DIR, 'matrix4.txt'), chunksize=1))
+        self.assertEqual(1, len(chunks))
+        self.assertEqual([1,2,3], chunks[0].values[0][0])
+
+    def test_writing_in_chunks(self):
+        infile = path.join(TEST_DIR, 'matrix.txt')
+        expected = to_string(pd.read_perseus(infile))
+        out = StringIO()
+        with PerseusWriter(out) as writer:
+            for chunk in pd.read_perseus(infile, chunksize=30):
+                writer.write(chunk)
+        self.assertEqual(expected, out.getvalue())
+
+    def test_writing_chunks_with_different_schema_should_fail(self):
+        with PerseusWriter(StringIO()) as writer:
+            writer.write(pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']}))
+            writer.write(pd.DataFrame({'a': [1.5, np.nan], 'b': ['z', 'w']}))
+            with self.assertRaises(ValueError):
+                writer.write(pd.DataFrame({'a': [1, 2]}))
+            with self.assertRaises(ValueError):
+                writer.write(pd.DataFrame({'a': ['1', '2'], 'b': ['x', 'y']}))
+
+    def test_reading_multi_numeric_columns_as_ragged_array(self):
+        infile = path.join(TEST_DIR, 'matrix4.txt')
+        df = pd.read_perseus(infile, multi_numeric='ragged')
+        array = df['MultiNum'].array
+        self.assertIsInstance(array, MultiNumericArray)
+        self.assertEqual([1.0, 2.0, 3.0], list(array.values))
+        self.assertEqual([0, 3], list(array.offsets))
+        self.assertEqual(to_string(pd.read_perseus(infile)), to_string(df))
+
+    def test_multi_numeric_array_from_strings(self):
+        array = MultiNumericArray.from_strings(['1;2;3', '', np.nan, '4;;5;', '6'])
+        self.assertEqual([3, 0, 0, 2, 1], list(array.lengths()))
+        self.assertEqual([6, 0, 0, 9, 6], list(array.row_sums()))
+        self.assertEqual([4.0, 5.0], list(array[3]))
+        self.assertEqual(['6.0', '1.0;2.0;3.0'], list(array.take([4, 0]).to_strings()))
+        self.assertEqual(['', '4.0;5.0'], list(array[2:4].to_strings()))
+        self.assertEqual([9.0], list(array[2:4].row_sums()[1:]))
+
+    def test_writing_list_columns_as_multi_numeric(self):
+        df = pd.DataFrame({'m': [[1, 2.5], [], [3.0]], 't': ['a', [1], None], 'n': [1.0, 2.0, 3.0]})
+        lines = to_string(df, main_columns=[]).splitlines()
+        self.assertEqual('#!{Type}M\tT\tN', lines[1])
+        self.assertEqual(['1;2.5\ta\t1.0', '\t[1]\t2.0', '3.0\t\t3.0'], lines[2:])
+
+    def test_writing_converted_columns_in_chunks_does_not_modify_input(self):
+        df = pd.DataFrame({'b': [True, False, True], 'm': [[1.0], [2.0, 3.0], []], 'n': [1, 2, 3]})
+        expected = to_string(df)
+        self.assertEqual(expected, to_string(df, chunksize=2))
+        self.assertEqual(np.dtype('bool'), df['b'].dtype)
+        self.assertEqual([2.0, 3.0], df['m'][1])
+
+    def test_reading_compact_dtypes(self):
+        infile = path.join(TEST_DIR, 'matrix3.txt')
+        df = pd.read_perseus(infile, float_dtype='float32', text_dtype='category')
+        dtypes = df.dtypes.astype(str)
+        self.assertEqual(['float32'] * 3, list(dtypes[:3]))
+        self.assertEqual(['category'] * 5, list(dtypes[-5:]))
+        self.assertEqual(to_string(pd.read_perseus(infile)), to_string(pd.read_perseus(infile, text_dtype='category')))
+        df = pd.read_perseus(infile, text_dtype='string')
+        self.assertEqual(to_string(pd.read_perseus(infile)), to_string(df))
+
+    def test_categorical_text_columns_are_written_as_text(self):
+        f = StringIO('a\tb\tc\n#!{Type}T\tC\tT\n' + ''.join('x\ty\t{}\n'.format(i) for i in range(10)))
+        for text_dtype in ['category', 'auto']:
+            f.seek(0)
+            df = pd.read_perseus(f, text_dtype=text_dtype)
+            self.assertEqual('category', str(df['a'].dtype))
+            self.assertEqual('#!{Type}T\tC\tT', type_row(df, main_columns=[]))
+            self.assertEqual('#!{Type}T\tC', type_row(df[['a', 'b']], main_columns=[]))
+        self.assertEqual('#!{Type}C', type_row(pd.DataFrame({'a': pd.Categorical(['x'])}), main_columns=[]))
+        f.seek(0)
+        self.assertEqual({}, pd.read_perseus(f).attrs)
+
+    def test_reading_text_as_categories_for_low_cardinality(self):
+        f = StringIO('a\tb\n#!{Type}T\tT\n' + ''.join('x\t{}\n'.format(i) for i in range(10)))
+        df = pd.read_perseus(f, text_dtype='auto')
+        self.assertEqual('category', str(df['a'].dtype))
+        self.assertEqual(np.dtype('object'), df['b'].dtype)
+
+    def test_reading_with_encoding(self):
+        text = 'µg\tName\n#!{Type}E\tT\n1.5\tä\n'.encode('latin-1')
+        for kwargs in [{}, {'chunksize': 1}]:
+            df = pd.read_perseus(BytesIO(text), encoding='latin-1', **kwargs)
+            if 'chunksize' in kwargs:
+                df = next(df)
+            self.assertEqual(['µg', 'Name'], list(df.columns))
+            self.assertEqual('ä', df['Name'][0])
+        self.assertEqual(['µg', 'Name'], read_header(BytesIO(text), encoding='latin-1')[0]['Column Name'])
+
+    def test_reading_text_as_categories_in_chunks(self):
+        text = 'a\tb\n#!{Type}T\tT\n' + ''.join('x\t{}\n'.format(i if i >= 10 else 0) for i in range(30))
+        chunks = list(pd.read_perseus(StringIO(text), text_dtype='auto', chunksize=10))
+        self.assertEqual([['category', 'category']] * 3, [list(chunk.dtypes.astype(str)) for chunk in chunks])
+        out = StringIO()
+        with PerseusWriter(out) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        self.assertEqual(to_string(pd.read_perseus(StringIO(text))), out.getvalue())
+
+    def test_writing_compact_dtypes(self):
+        df = pd.DataFrame({'a': np.array([1, 2], dtype='float32'), 'b': np.array([1, 2], dtype='int32'),
+            'c': np.array([1, 2], dtype='int8')})
+        self.assertEqual('#!{Type}N\tN\tN', type_row(df, main_columns=[]))
+        self.assertEqual('1.5', to_string(pd.DataFrame({'a': np.array([1.5], dtype='float32')})).splitlines()[-1])
+
+    def test_selecting_columns_by_type_and_annotation_row(self):
+        infile = path.join(TEST_DIR, 'matrix.txt')
+        df = pd.read_perseus(infile, types={'E'}, where={'C:Grouping': {'Group1', 'Group3'}})
+        self.assertEqual(10, df.shape[1])
+        self.assertEqual({'Group1', 'Group3'}, set(df.columns.get_level_values('Grouping')))
+        full = pd.read_perseus(infile)
+        self.assertTrue(full.iloc[:, list(range(5)) + list(range(10, 15))].equals(df))
+        df = pd.read_perseus(infile, usecols=['Name', 'Column 2'])
+        self.assertEqual(['Column 2', 'Name'], list(df.columns.get_level_values('Column Name')))
+        df = pd.read_perseus(infile, types={'T'}, usecols=lambda name: name.startswith('Column'))
+        self.assertEqual(0, df.shape[1])
+        with self.assertRaises(ValueError):
+            pd.read_perseus(infile, usecols=['Missing'])
+        ncol = full.shape[1]
+        self.assertEqual(2, pd.read_perseus(infile, usecols=[0, ncol - 1]).shape[1])
+        for position in [ncol, -1]:
+            with self.assertRaises(ValueError):
+                pd.read_perseus(infile, usecols=[0, position])
+
+    def test_reading_with_different_engines(self):
+        engines = ['c', 'pyarrow'] # falls back to pandas without pyarrow
+        for name in ['matrix.txt', 'matrix2.txt', 'matrix3.txt', 'allPeptides.txt.sample']:
+            infile = path.join(TEST_DIR, name)
+            for kwargs in [{}, {'float_dtype': 'float32', 'text_dtype': 'category'}, {'types': {'E', 'T'}}]:
+                expected = pd.read_perseus(infile, float_precision='round_trip', **kwargs)
+                for engine in engines:
+                    df = pd.read_perseus(infile, engine=engine, float_precision='round_trip', **kwargs)
+                    pd.testing.assert_frame_equal(expected, df, check_exact=True)
+                    df = pd.read_perseus(infile, engine=engine, **kwargs)
+                    if engine == 'pyarrow':
+                        pd.testing.assert_frame_equal(expected, df, check_exact=True)
+                df = pd.read_perseus(infile, engine='python', **kwargs) # rounds like the default parser
+                pd.testing.assert_frame_equal(pd.read_perseus(infile, **kwargs), df, check_exact=True)
+        infile = path.join(TEST_DIR, 'matrix4.txt')
+        expected = pd.read_perseus(infile, multi_numeric='ragged', float_precision='round_trip')
+        for engine in engines:
+            df = pd.read_perseus(infile, multi_numeric='ragged', engine=engine)
+            pd.testing.assert_frame_equal(expected, df, check_exact=True)
+        self.assertTrue(pd.read_perseus(infile).equals(pd.read_perseus(infile, engine='pyarrow')))
+        header_only = b'a\tb\tc\n#!{Type}E\tT\tC\n'
+        expected = pd.read_perseus(BytesIO(header_only))
+        self.assertEqual((0, 3), expected.shape)
+        for engine in engines + ['python']:
+            pd.testing.assert_frame_equal(expected, pd.read_perseus(BytesIO(header_only), engine=engine), check_exact=True)
+
+    def test_reading_many_matrices(self):
+        infiles = [path.join(TEST_DIR, name) for name in ['matrix.txt', 'matrix4.txt', 'matrix.txt']]
+        expected = [pd.read_perseus(infile, multi_numeric='ragged') for infile in infiles]
+        for workers in [1, 2]:
+            dfs = pd.read_perseus_many(infiles, workers=workers, multi_numeric='ragged')
+            self.assertEqual(len(expected), len(dfs))
+            for df, expected_df in zip(dfs, expected):
+                pd.testing.assert_frame_equal(expected_df, df)
+        df = pd.read_perseus_many(infiles[::2], workers=2, concat=True)
+        self.assertEqual(2 * expected[0].shape[0], df.shape[0])
+        self.assertTrue(df.columns.equals(expected[0].columns))
+
+    def test_reading_in_parallel(self):
+        for name in ['matrix.txt', 'matrix4.txt', 'allPeptides.txt.sample']:
+            infile = path.join(TEST_DIR, name)
+            for kwargs in [{}, {'multi_numeric': 'ragged', 'text_dtype': 'category'}]:
+                expected = pd.read_perseus(infile, **kwargs)
+                for workers in [2, 5]:
+                    df = pd.read_perseus(infile, workers=workers, **kwargs)
+                    pd.testing.assert_frame_equal(expected, df)
+
+    def test_reading_in_parallel_with_row_selection(self):
+        infile = path.join(TEST_DIR, 'matrix.txt')
+        for kwargs in [{'nrows': 10}, {'skiprows': [0, 1]}, {'skipfooter': 3, 'engine': 'python'}]:
+            expected = pd.read_perseus(infile, **kwargs)
+            df = pd.read_perseus(infile, workers=4, **kwargs)
+            pd.testing.assert_frame_equal(expected, df)
+        self.assertEqual(10, len(pd.read_perseus(infile, nrows=10, workers=4)))
+
+    def test_writing_in_parallel(self):
+        df = pd.DataFrame(np.random.rand(500, 3), columns=pd.Index(['a', 'b', 'c'], name='Column Name'))
+        df['Text'] = ['row{}'.format(i) for i in range(len(df))]
+        df['Flag'] = np.arange(len(df)) % 3 == 0
+        for float_format in [None, '%.3g']:
+            expected = to_string(df, float_format=float_format)
+            self.assertEqual(expected, to_string(df, float_format=float_format, workers=3, chunksize=40))
+            numeric = df[['a', 'b', 'c']]
+            self.assertEqual(to_string(numeric, float_format=float_format),
+                to_string(numeric, float_format=float_format, workers=3, chunksize=40))
+        self.assertIn('\t0.5\t', to_string(pd.DataFrame({'x': [0.0], 'y': [0.50001], 'z': [1.0]}), float_format='%.3g'))
+
+    def test_reading_and_writing_compressed_matrices(self):
+        infile = path.join(TEST_DIR, 'matrix4.txt')
+        df = pd.read_perseus(infile)
+        extensions = ['.gz', '.bz2', '.xz']
+        try:
+            import zstandard
+            extensions.append('.zst')
+        except ImportError:
+            pass
+        for extension in extensions:
+            outfile = path.join(TEST_DIR, 'compressed.txt' + extension)
+            misnamed = path.join(TEST_DIR, 'compressed.txt')
+            try:
+                df.to_perseus(outfile)
+                with open(outfile, 'rb') as f:
+                    self.assertFalse(f.read().startswith(b'Column'))
+                self.assertTrue(df.equals(pd.read_perseus(outfile)))
+                self.assertEqual(read_header(infile)[0]['Type'], read_header(outfile)[0]['Type'])
+                os.rename(outfile, misnamed) # detected by magic bytes
+                with open(misnamed, 'rb') as f:
+                    self.assertEqual(read_header(infile)[0]['Column Name'], read_header(f)[0]['Column Name'])
+                    self.assertEqual(0, f.tell())
+                    self.assertTrue(df.equals(pd.read_perseus(f)))
+            finally:
+                for tmp_file in [outfile, misnamed]:
+                    if path.exists(tmp_file):
+                        os.remove(tmp_file)
+
 if __name__ == '__main__':
     main()
@@ -1,6 +1,6 @@
 import sys
 from shutil import rmtree
-from os import path, makedirs
+from os import path, makedirs, listdir
 from unittest import TestCase, main
 from io import StringIO
 from perseuspy import nx, pd, read_networks, write_networks
@@ -32,6 +32,59 @@ class TestReadingAndWritingFromFolder(TestCase):
         self.assertTrue(networks[guid]['edge_table'].equals(_networks[guid]['edge_table']))
         rmtree(tmp_dir)
 
+    def test_reading_lazily(self):
+        folder = path.join(TEST_DIR, 'network_random')
+        networks_table, networks = read_networks(folder)
+        _, eager = read_networks(folder, lazy=False)
+        guid = networks_table['GUID'][1]
+        network = networks[guid]
+        self.assertEqual(0, len(networks._tables))
+        self.assertTrue(eager[guid]['edge_table'].equals(network['edge_table']))
+        self.assertIs(network['edge_table'], network['edge_table'])
+        self.assertEqual({'name', 'guid', 'node_table', 'edge_table'}, set(network))
+        _, networks = read_networks(folder, cache_size=0)
+        self.assertIsNot(networks[guid]['node_table'], networks[guid]['node_table'])
+        self.assertEqual(0, len(networks._tables))
+
+    def test_selecting_networks(self):
+        folder = path.join(TEST_DIR, 'network_random')
+        networks_table, _ = read_networks(folder)
+        guid = networks_table['GUID'][2]
+        selected_table, networks = read_networks(folder, select=[guid])
+        self.assertEqual([guid], list(networks))
+        self.assertEqual([guid], list(selected_table['GUID']))
+        name = networks_table['Name'][0]
+        selected_table, networks = read_networks(folder, select=lambda row: row['Name'] == name)
+        self.assertEqual([networks_table['GUID'][0]], list(networks))
+
+    def test_writing_compressed(self):
+        networks_table, networks = read_networks(path.join(TEST_DIR, 'network_random'))
+        tmp_dir = path.join(TEST_DIR, 'tmp_compressed')
+        write_networks(tmp_dir, networks_table, networks, compression='gzip')
+        self.assertTrue(path.isfile(path.join(tmp_dir, 'networks.txt.gz')))
+        _networks_table, _networks = read_networks(tmp_dir)
+        self.assertTrue(networks_table.equals(_networks_table))
+        guid = networks_table['GUID'][0]
+        self.assertTrue(networks[guid]['edge_table'].equals(_networks[guid]['edge_table']))
+        rmtree(tmp_dir)
+
+    def test_reading_and_writing_concurrently(self):
+        folder = path.join(TEST_DIR, 'network_random')
+        networks_table, networks = read_networks(folder, lazy=False)
+        tmp_dir = path.join(TEST_DIR, 'tmp_concurrent')
+        for pool in ['thread', 'process']:
+            _networks_table, _networks = read_networks(folder, workers=2, pool=pool)
+            for guid in networks:
+                self.assertTrue(networks[guid]['node_table'].equals(_networks[guid]['node_table']))
+                self.assertTrue(networks[guid]['edge_table'].equals(_networks[guid]['edge_table']))
+            write_networks(tmp_dir, _networks_table, _networks, workers=2, pool=pool)
+            self.assertEqual(2 * len(networks) + 1, len(listdir(tmp_dir))) # no temporary files left
+            _networks_table, _networks = read_networks(tmp_dir, lazy=False)
+            self.assertTrue(networks_table.equals(_networks_table))
+            for guid in networks:
+                self.assertTrue(networks[guid]['edge_table'].equals(_networks[guid]['edge_table']))
+            rmtree(tmp_dir)
+
 class TestNetworkx(TestCase):
     def test_create_networkx_graph_duplicates(self):
         networks_table = pd.DataFrame({'GUID' : ['guid'], 'Name': ['net']})
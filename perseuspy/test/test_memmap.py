@@ -0,0 +1,48 @@
+from unittest import TestCase, main
+import os
+from os import path
+from shutil import rmtree, copyfile
+import tempfile
+import numpy as np
+from perseuspy import pd
+from perseuspy.io.perseus.memmap import read_main_memmap
+from perseuspy.io.perseus.matrix import main_df
+
+TEST_DIR = path.dirname(__file__)
+
+class TestMainMemmap(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.infile = path.join(self.tmp_dir, 'matrix.txt')
+        copyfile(path.join(TEST_DIR, 'matrix.txt'), self.infile)
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_main_columns_are_memory_mapped(self):
+        values, rows, columns = read_main_memmap(self.infile)
+        self.assertIsInstance(values, np.memmap)
+        df = pd.read_perseus(self.infile)
+        main = main_df(self.infile, df)
+        np.testing.assert_array_equal(main.values, values)
+        self.assertTrue(main.columns.equals(columns))
+        self.assertEqual(['Name'], list(rows.columns.get_level_values('Column Name')))
+
+    def test_float32_values_are_reused(self):
+        values, _, _ = read_main_memmap(self.infile, dtype='float32')
+        _values, _, _ = read_main_memmap(self.infile, dtype='float32')
+        self.assertEqual(np.dtype('float32'), _values.dtype)
+        self.assertEqual(values.filename, _values.filename)
+        np.testing.assert_array_equal(values, _values)
+
+    def test_values_are_extracted_again_for_replaced_matrix(self):
+        read_main_memmap(self.infile)
+        df = pd.read_perseus(self.infile).head(3)
+        df.to_perseus(self.infile)
+        os.utime(self.infile, (0, 0)) # older than the binary file, e.g. after cp -p
+        values, rows, _ = read_main_memmap(self.infile)
+        self.assertEqual((3, 3), (values.shape[0], rows.shape[0]))
+        np.testing.assert_array_equal(main_df(self.infile, df).values, values)
+
+if __name__ == '__main__':
+    main()
@@ -45,5 +45,34 @@ class TestParameters(TestCase):
         self.assertFalse(value)
         self.assertEqual(0, len(subparam))
 
+class TestParametersObject(TestCase):
+
+    def setUp(self):
+        self.parameters = Parameters.parse(path.join(TEST_DIR, 'parameters.xml'))
+
+    def test_typed_values(self):
+        self.assertEqual(15, self.parameters['Number of columns'])
+        self.assertEqual(2.0, self.parameters['Box size'])
+        self.assertEqual('some_file.txt', self.parameters['someFile.txt'])
+        self.assertEqual('Two normal distributions', self.parameters['Mode'])
+        self.assertEqual(-1, self.parameters['Test'])
+        self.assertEqual(['T', 'Y'], self.parameters['Select'])
+
+    def test_sub_parameters_are_scoped(self):
+        self.assertNotIn('Sub', self.parameters)
+        value, subparameters = self.parameters['Choose']
+        self.assertEqual('B', value)
+        self.assertEqual(3.0, subparameters['Sub'])
+        self.assertEqual(['Sub'], list(subparameters))
+        value, subparameters = self.parameters['Choose bool 2']
+        self.assertFalse(value)
+        self.assertEqual(0, len(subparameters))
+
+    def test_to_dict(self):
+        values = self.parameters.to_dict()
+        self.assertEqual(('B', {'Sub': 3.0}), values['Choose'])
+        self.assertEqual((True, {'Sub': 'false'}), values['Choose bool'])
+        self.assertEqual(len(self.parameters), len(values))
+
 if __name__ == '__main__':
     main()
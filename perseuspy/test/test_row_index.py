@@ -0,0 +1,50 @@
+from unittest import TestCase, main
+import os
+from os import path
+from shutil import rmtree, copyfile
+import tempfile
+import numpy as np
+from perseuspy import pd
+from perseuspy.io.perseus.row_index import read_perseus_rows, default_index_file
+
+TEST_DIR = path.dirname(__file__)
+
+class TestRowIndex(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.infile = path.join(self.tmp_dir, 'allPeptides.txt')
+        copyfile(path.join(TEST_DIR, 'allPeptides.txt.sample'), self.infile)
+        self.df = pd.read_perseus(self.infile)
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_reading_rows_by_position(self):
+        rows = [5, 0, 5, len(self.df) - 1]
+        df = read_perseus_rows(self.infile, rows=rows)
+        self.assertTrue(path.isfile(default_index_file(self.infile)))
+        pd.testing.assert_frame_equal(self.df.iloc[rows], df)
+        df = read_perseus_rows(self.infile, rows=[])
+        self.assertEqual((0, self.df.shape[1]), df.shape)
+        with self.assertRaises(IndexError):
+            read_perseus_rows(self.infile, rows=[len(self.df)])
+
+    def test_reading_rows_by_key(self):
+        key_column = self.df.columns.get_level_values('Column Name')[0]
+        keys = self.df[key_column].astype(str).unique()[[3, 1]]
+        df = read_perseus_rows(self.infile, keys=list(keys) + ['missing'], key_column=key_column)
+        expected = self.df[self.df[key_column].astype(str).isin(keys)]
+        pd.testing.assert_frame_equal(expected, df)
+        with self.assertRaises(ValueError):
+            read_perseus_rows(self.infile, keys=keys)
+
+    def test_index_is_rebuilt_for_replaced_matrix(self):
+        read_perseus_rows(self.infile, rows=[0])
+        copyfile(path.join(TEST_DIR, 'matrix.txt'), self.infile)
+        os.utime(self.infile, (0, 0)) # older than the index, e.g. after cp -p
+        expected = pd.read_perseus(self.infile)
+        rows = [0, len(expected) - 1]
+        pd.testing.assert_frame_equal(expected.iloc[rows], read_perseus_rows(self.infile, rows=rows))
+
+if __name__ == '__main__':
+    main()
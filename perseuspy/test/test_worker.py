@@ -0,0 +1,117 @@
+from unittest import TestCase, main, skipUnless, mock
+from os import path
+from shutil import rmtree
+import os
+import sys
+import socket
+import tempfile
+import threading
+from multiprocessing.connection import Client
+from perseuspy import pd
+from perseuspy.worker import serve, request, shutdown, runtime_dir, MatrixCache
+
+TEST_DIR = path.dirname(__file__)
+
+script = """
+import sys
+from perseuspy import pd
+_, infile, outfile = sys.argv
+df = pd.read_perseus(infile)
+df.head(15).to_perseus(outfile)
+print(df.shape[0])
+"""
+
+class TestWorker(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.script = path.join(self.tmp_dir, 'plugin.py')
+        with open(self.script, 'w') as f:
+            f.write(script)
+        if hasattr(socket, 'AF_UNIX') and sys.platform != 'win32':
+            self.address = path.join(self.tmp_dir, 'worker.sock')
+        else:
+            self.address = ('localhost', 47322)
+        self.authkey_file = path.join(self.tmp_dir, 'worker.key')
+        self.cache = MatrixCache()
+        self.worker = threading.Thread(target=serve, args=(self.address, self.authkey_file, self.cache))
+        self.worker.start()
+        while not path.isfile(self.authkey_file):
+            self.worker.join(0.01)
+
+    def tearDown(self):
+        if self.worker.is_alive():
+            shutdown(self.address, self.authkey_file)
+        self.worker.join()
+        rmtree(self.tmp_dir)
+
+    def test_running_scripts_in_worker(self):
+        infile = path.join(TEST_DIR, 'matrix.txt')
+        outfile = path.join(self.tmp_dir, 'out.txt')
+        for _ in range(2):
+            status, code, stdout, stderr = request('run', self.script, [infile, outfile], self.address, self.authkey_file)
+            self.assertEqual('ok', status, stderr)
+            self.assertEqual('100', stdout.strip())
+        self.assertEqual((1, 1), (self.cache.misses, self.cache.hits))
+        self.assertTrue(pd.read_perseus(infile).head(15).equals(pd.read_perseus(outfile)))
+
+    def test_errors_are_reported(self):
+        status, code, stdout, stderr = request('run', self.script, [], self.address, self.authkey_file)
+        self.assertEqual('error', status)
+        self.assertIn('ValueError', stderr)
+        status, result, _, _ = request('call', 'os.path:join', ['a', 'b'], self.address, self.authkey_file)
+        self.assertEqual(('ok', path.join('a', 'b')), (status, result))
+
+    def test_scripts_import_modules_from_their_folder(self):
+        helper = path.join(self.tmp_dir, 'helper.py')
+        plugin = path.join(self.tmp_dir, 'helper_plugin.py')
+        with open(plugin, 'w') as f:
+            f.write('import helper\nprint(helper.value)\n')
+        for value in [42, 1234]: # sizes differ, so stale bytecode is detected within the same second
+            with open(helper, 'w') as f:
+                f.write('value = {}\n'.format(value))
+            status, code, stdout, stderr = request('run', plugin, [], self.address, self.authkey_file)
+            self.assertEqual(('ok', str(value)), (status, stdout.strip()), stderr)
+        self.assertNotIn('helper', sys.modules)
+        self.assertNotIn(self.tmp_dir, sys.path)
+
+    def test_worker_survives_broken_connections(self):
+        family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+        for send in [b'', b'garbage']:
+            with socket.socket(family) as client:
+                client.connect(self.address)
+                client.sendall(send)
+        with self.assertRaises(Exception):
+            Client(self.address, authkey=b'wrong key').close()
+        status, result, _, _ = request('call', 'os.path:join', ['a', 'b'], self.address, self.authkey_file)
+        self.assertEqual(('ok', path.join('a', 'b')), (status, result))
+        self.assertTrue(self.worker.is_alive())
+
+    def test_fallback_without_worker(self):
+        shutdown(self.address, self.authkey_file)
+        self.worker.join()
+        status, result, _, _ = request('call', 'os.path:join', ['a', 'b'], self.address, self.authkey_file)
+        self.assertEqual(('ok', path.join('a', 'b')), (status, result))
+
+    @skipUnless(hasattr(os, 'getuid'), 'file ownership is not checked on Windows')
+    def test_untrusted_key_files_are_refused(self):
+        os.chmod(self.authkey_file, 0o644)
+        with self.assertRaises(PermissionError):
+            request('call', 'os.path:join', ['a', 'b'], self.address, self.authkey_file, fallback=False)
+        status, result, _, _ = request('call', 'os.path:join', ['a', 'b'], self.address, self.authkey_file)
+        self.assertEqual(('ok', path.join('a', 'b')), (status, result)) # executed locally
+        os.chmod(self.authkey_file, 0o600)
+
+    @skipUnless(hasattr(os, 'getuid'), 'directory ownership is not checked on Windows')
+    def test_runtime_dir_is_private(self):
+        os.chmod(self.tmp_dir, 0o755)
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': self.tmp_dir}):
+            with self.assertRaises(PermissionError):
+                runtime_dir()
+        os.chmod(self.tmp_dir, 0o700)
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': self.tmp_dir}):
+            self.assertEqual(self.tmp_dir, runtime_dir())
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': ''}):
+            self.assertEqual(0o700, os.stat(runtime_dir()).st_mode & 0o777)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+""" Persistent worker process for Perseus plugin calls
+
+Starting a new interpreter and importing pandas dominates the run time of
+plugins on small matrices. The worker keeps a warm interpreter running and
+executes plugin scripts and entry points on behalf of a thin client, which
+only imports the standard library. Matrices read by `pd.read_perseus` in the
+worker are kept in an in-memory LRU cache keyed by file identity.
+
+Start the worker once:
+
+.. code:: bash
+
+    python -m perseuspy.worker serve
+
+and call it from Perseus in place of the plugin script. If no worker is
+running, the script is executed in the client process instead:
+
+.. code:: bash
+
+    python -m perseuspy.worker run plugin.py parameters.xml infile outfile
+    python -m perseuspy.worker call perseuspy.dependent_peptides:run_dependent_peptides_from_parameters parameters.xml outfile
+
+The worker listens on a Unix socket in a private directory of the current
+user, `$XDG_RUNTIME_DIR` or a 0700 directory in the temporary directory, or on
+a localhost TCP port on Windows. Connections are authenticated with a random
+key stored in a file only readable by the current user. The client refuses key
+files owned by other users or readable by others and runs the script locally.
+"""
+import os
+import sys
+import io
+import runpy
+import stat
+import socket
+import getpass
+import tempfile
+import importlib
+import logging
+import traceback
+from collections import OrderedDict
+from contextlib import redirect_stdout, redirect_stderr
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+logger = logging.getLogger(__name__)
+
+default_port = 47321
+
+def runtime_dir():
+    """
+    Private directory of the current user for the socket and key file.
+    `$XDG_RUNTIME_DIR` if set, otherwise a directory in the temporary directory
+    which is created with mode 0700.
+    :raises PermissionError: If the directory is owned by another user or accessible by others.
+    """
+    directory = os.environ.get('XDG_RUNTIME_DIR', '')
+    if directory == '' or not os.path.isdir(directory):
+        directory = os.path.join(tempfile.gettempdir(), 'perseuspy-{}'.format(getpass.getuser()))
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+    _check_private(os.lstat(directory), directory, stat.S_ISDIR)
+    return directory
+
+def _check_private(status, name, is_type):
+    """ Raise PermissionError unless the file is of the expected type, owned by the current user and inaccessible to others. """
+    if not hasattr(os, 'getuid'): # Windows
+        return
+    if not is_type(status.st_mode) or status.st_uid != os.getuid() or stat.S_IMODE(status.st_mode) & 0o077:
+        raise PermissionError('{} is not private to the current user.'.format(name))
+
+def default_address():
+    """ Unix socket in the `runtime_dir`, localhost TCP port on Windows. """
+    if hasattr(socket, 'AF_UNIX') and sys.platform != 'win32':
+        return os.path.join(runtime_dir(), 'perseuspy-worker.sock')
+    return ('localhost', default_port)
+
+def default_authkey_file():
+    """ The file holding the authentication key of the worker. """
+    return os.path.join(runtime_dir(), 'perseuspy-worker.key')
+
+def _read_authkey(authkey_file):
+    """ Read the key, which has to be a regular file only accessible by the current user. """
+    fd = os.open(authkey_file, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    with os.fdopen(fd, 'rb') as f:
+        _check_private(os.fstat(f.fileno()), authkey_file, stat.S_ISREG)
+        return f.read()
+
+def _write_authkey(authkey_file, authkey):
+    """ Write the key to a file only readable by the current user. """
+    if os.path.exists(authkey_file):
+        os.remove(authkey_file)
+    fd = os.open(authkey_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(authkey)
+
+class MatrixCache():
+    """LRU cache of parsed matrices keyed by file identity and read options.
+    Cached data frames are copied on each hit, so plugins can modify them freely.
+    :param max_bytes: Maximal total memory of the cached data frames, default=1GiB.
+    :param max_entries: Maximal number of cached data frames, default=32."""
+    def __init__(self, max_bytes=1024**3, max_entries=32):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def read_perseus(self, read_perseus, path_or_file, **kwargs):
+        """ Read a matrix through the cache, see `read_perseus`. File-likes and chunked reads are not cached. """
+        from perseuspy.io.perseus.cache import file_identity
+        if not isinstance(path_or_file, str) or kwargs.get('chunksize') is not None:
+            return read_perseus(path_or_file, **kwargs)
+        key = (file_identity(path_or_file), repr(sorted((k, repr(v)) for k, v in kwargs.items())))
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0].copy()
+        self.misses += 1
+        df = read_perseus(path_or_file, **kwargs)
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes <= self.max_bytes:
+            self.entries[key] = (df.copy(), nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes or len(self.entries) > self.max_entries:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+        return df
+
+def serve(address=None, authkey_file=None, cache=None, max_requests=None):
+    """
+    Run the worker until a 'shutdown' request is received.
+    :param address: Socket path or (host, port) tuple, default=None uses `default_address`.
+    :param authkey_file: Path of the authentication key file, default=None uses `default_authkey_file`.
+    :param cache: MatrixCache, default=None creates a new cache.
+    :param max_requests: Stop after this many requests, default=None runs until shutdown.
+    """
+    import perseuspy
+    from perseuspy import pd
+    read_perseus = perseuspy.io.perseus.matrix.read_perseus
+    address = default_address() if address is None else address
+    authkey_file = default_authkey_file() if authkey_file is None else authkey_file
+    cache = MatrixCache() if cache is None else cache
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address) # stale socket of a previous worker
+    authkey = os.urandom(32)
+    pd.read_perseus = lambda path_or_file, **kwargs: cache.read_perseus(read_perseus, path_or_file, **kwargs)
+    requests = 0
+    try:
+        with Listener(address, authkey=authkey) as listener:
+            _write_authkey(authkey_file, authkey) # clients can connect from now on
+            while max_requests is None or requests < max_requests:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e: # e.g. client disconnected during the handshake
+                    logger.warning('Rejected connection: %r', e)
+                    continue
+                with connection:
+                    try:
+                        request = connection.recv()
+                        requests += 1
+                        if request[0] == 'shutdown':
+                            connection.send(('ok', None, '', ''))
+                            break
+                        connection.send(_handle(request))
+                    except (OSError, EOFError) as e: # e.g. plugin cancelled by Perseus
+                        logger.warning('Lost connection to client: %r', e)
+    finally:
+        pd.read_perseus = read_perseus
+        if os.path.exists(authkey_file):
+            os.remove(authkey_file)
+
+def _handle(request):
+    """
+    Execute a 'run' or 'call' request in the working directory of the client.
+    :returns: Tuple of status ('ok' or 'error'), result or exit code, stdout and stderr.
+    """
+    kind, target, args, cwd = request
+    stdout, stderr = io.StringIO(), io.StringIO()
+    previous_cwd, previous_argv = os.getcwd(), sys.argv
+    status, result = 'ok', None
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            result = _execute(kind, target, args)
+    except SystemExit as e:
+        status, result = ('ok' if not e.code else 'error'), e.code
+    except Exception:
+        status, result = 'error', None
+        stderr.write(traceback.format_exc())
+    finally:
+        os.chdir(previous_cwd)
+        sys.argv = previous_argv
+    return status, result, stdout.getvalue(), stderr.getvalue()
+
+def _execute(kind, target, args):
+    """
+    Run a script with arguments or call a 'module:function' entry point.
+    Like `python script.py`, the directory of a script is put first on `sys.path`.
+    Modules imported from that directory are removed from `sys.modules` after the run,
+    so changes to helper modules take effect and equally named helpers of different
+    plugins do not clash.
+    """
+    if kind == 'run':
+        sys.argv = [target] + list(args)
+        script_dir = os.path.dirname(os.path.abspath(target))
+        previous_path, previous_modules = list(sys.path), set(sys.modules)
+        sys.path.insert(0, script_dir)
+        try:
+            runpy.run_path(target, run_name='__main__')
+        finally:
+            sys.path[:] = previous_path
+            _remove_modules(set(sys.modules) - previous_modules, script_dir)
+        return None
+    if kind == 'call':
+        module, function = target.split(':')
+        return getattr(importlib.import_module(module), function)(*args)
+    raise ValueError('Unknown request {}.'.format(kind))
+
+def _remove_modules(names, directory):
+    """ Remove the modules imported from a directory from `sys.modules`. """
+    directory = os.path.join(os.path.normcase(os.path.abspath(directory)), '')
+    for name in names:
+        module_file = getattr(sys.modules.get(name), '__file__', None)
+        if module_file and os.path.normcase(os.path.abspath(module_file)).startswith(directory):
+            del sys.modules[name]
+
+def request(kind, target, args, address=None, authkey_file=None, fallback=True):
+    """
+    Execute a request in the worker, or locally if no worker is running.
+    :param kind: Either 'run' for scripts or 'call' for 'module:function' entry points.
+    :param target: Script path or entry point.
+    :param args: Command line arguments of the script or arguments of the entry point.
+    :param address: Socket path or (host, port) tuple, default=None uses `default_address`.
+    :param authkey_file: Path of the authentication key file, default=None uses `default_authkey_file`.
+    :param fallback: Execute locally if no worker is running, default=True.
+    :returns: Tuple of status ('ok' or 'error'), result or exit code, stdout and stderr.
+    """
+    address = default_address() if address is None else address
+    authkey_file = default_authkey_file() if authkey_file is None else authkey_file
+    message = (kind, os.path.abspath(target) if kind == 'run' else target, list(args), os.getcwd())
+    try:
+        authkey = _read_authkey(authkey_file)
+        connection = Client(address, authkey=authkey)
+    except OSError: # no worker running or not trusted
+        if not fallback:
+            raise
+        return _handle(message)
+    with connection:
+        connection.send(message)
+        return connection.recv()
+
+def shutdown(address=None, authkey_file=None):
+    """ Stop a running worker. """
+    return request('shutdown', '', [], address, authkey_file, fallback=False)
+
+def main(argv=None):
+    """ Command line interface, see the module documentation. """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 0 or argv[0] not in {'serve', 'shutdown', 'run', 'call'}:
+        sys.stderr.write('usage: python -m perseuspy.worker serve|shutdown|run script [args]|call module:function [args]\n')
+        return 2
+    if argv[0] == 'serve':
+        serve()
+        return 0
+    if argv[0] == 'shutdown':
+        shutdown()
+        return 0
+    status, result, stdout, stderr = request(argv[0], argv[1], argv[2:])
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    if status == 'ok':
+        return 0
+    return result if isinstance(result, int) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,8 +15,10 @@ setup(name='perseuspy',
         author='Jan Rudolph',
         author_email='jan.daniel.rudolph@gmail.com',
         license='MIT',
-        packages=find_packages(),
-        install_requires=['pandas >= 0.24.0', 'networkx >= 2.1'],
+        packages=find_packages(exclude=['benchmarks']),
+        python_requires='>=3.7',
+        install_requires=['pandas >= 1.3.0', 'networkx >= 2.1'],
+        extras_require={'arrow': ['pyarrow'], 'zstd': ['zstandard']},
         test_suite = 'nose.collector',
         tests_require= ['nose']
 ) 